@@ -0,0 +1,9 @@
+import pytest
+
+from core.query_budget import query_budget as budget
+
+
+@pytest.fixture
+def query_budget():
+    """Контекстный менеджер с бюджетом запросов: query_budget(5)."""
+    return budget
@@ -0,0 +1,13 @@
+import pytest
+
+
+class TestQueryBudget:
+
+    @pytest.mark.django_db
+    def test_feeds_fit_budget(self, client, few_posts_with_group, query_budget):
+        group = few_posts_with_group.group
+        urls = ('/', f'/group/{group.slug}/', f'/profile/{few_posts_with_group.author.username}/')
+        for url in urls:
+            with query_budget(8, max_duplicates=0):
+                response = client.get(url)
+            assert response.status_code == 200, f'Страница `{url}` работает неправильно'
@@ -0,0 +1,92 @@
+"""Чтение с реплик, запись в основную базу.
+
+Реплики — алиасы из REPLICA_DATABASES. Поток, который уже писал, или
+запрос с cookie PRIMARY_PIN_COOKIE читает только основную базу: так
+пользователь сразу видит свои изменения, пока реплики догоняют.
+"""
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_state = threading.local()
+
+
+def pinned():
+    return getattr(_state, 'pinned', False)
+
+
+def pin():
+    _state.pinned = True
+
+
+def reset():
+    _state.pinned = False
+    _state.wrote = False
+
+
+@contextmanager
+def primary():
+    """Читать основную базу внутри блока."""
+    before = pinned()
+    pin()
+    try:
+        yield
+    finally:
+        _state.pinned = before
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = settings.REPLICA_DATABASES
+        if (
+            not replicas
+            or pinned()
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        pin()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # На репликах те же данные, что и в основной базе.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.REPLICA_DATABASES
+
+
+class PrimaryPinMiddleware:
+    """После записи ставит cookie, с которой чтение идёт с основной базы."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        reset()
+        if settings.PRIMARY_PIN_COOKIE in request.COOKIES:
+            pin()
+        response = self.get_response(request)
+        if getattr(_state, 'wrote', False):
+            response.set_cookie(
+                settings.PRIMARY_PIN_COOKIE,
+                '1',
+                max_age=settings.PRIMARY_PIN_SECONDS,
+                httponly=True,
+            )
+        return response
+
+
+def copy_to(alias, source=DEFAULT_DB_ALIAS):
+    """Копирует SQLite-базу source в реплику alias через backup API."""
+    source_connection = connections[source]
+    target_connection = connections[alias]
+    source_connection.ensure_connection()
+    target_connection.ensure_connection()
+    source_connection.connection.backup(target_connection.connection)
@@ -0,0 +1,120 @@
+"""SQLite для боевой нагрузки: прагмы, долгие соединения, повтор при BUSY.
+
+Подключается как ENGINE "core.db.sqlite3". Дополнительно к обычным
+ключам понимает:
+
+* OPTIONS["pragmas"] — прагмы поверх PRAGMAS, выполняются при
+  открытии соединения;
+* OPTIONS["transaction_mode"] — DEFERRED, IMMEDIATE или EXCLUSIVE
+  для BEGIN в atomic();
+* OPTIONS["busy_retries"] — сколько раз повторить запрос вне
+  транзакции, если база всё ещё занята после busy_timeout;
+* CONN_HEALTH_CHECKS — проверять долгое соединение перед запросом.
+"""
+import random
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+# WAL пускает читателей параллельно с писателем; NORMAL в WAL не теряет
+# целостность, только последние транзакции при отключении питания.
+PRAGMAS = {
+    "busy_timeout": 5000,
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -20000,
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+TRANSACTION_MODES = ("DEFERRED", "IMMEDIATE", "EXCLUSIVE")
+BUSY_DELAY = 0.05
+
+
+def is_busy(exc):
+    return str(exc).startswith(("database is locked", "database is busy"))
+
+
+class BusyRetryCursor(base.SQLiteCursorWrapper):
+    """Повторяет запрос с нарастающей паузой, пока база занята.
+
+    Внутри транзакции повтор бесполезен: блокировку держит уже она,
+    поэтому там ошибка уходит наверх сразу.
+    """
+
+    def __init__(self, connection, retries):
+        super().__init__(connection)
+        self.retries = retries
+
+    def retry(self, method, *args):
+        for attempt in range(self.retries + 1):
+            try:
+                return method(self, *args)
+            except base.Database.OperationalError as exc:
+                if (
+                    attempt == self.retries
+                    or self.connection.in_transaction
+                    or not is_busy(exc)
+                ):
+                    raise
+            time.sleep(BUSY_DELAY * 2 ** attempt * random.uniform(0.5, 1))
+
+    def execute(self, query, params=None):
+        return self.retry(base.SQLiteCursorWrapper.execute, query, params)
+
+    def executemany(self, query, param_list):
+        return self.retry(
+            base.SQLiteCursorWrapper.executemany, query, param_list
+        )
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def __init__(self, settings_dict, *args, **kwargs):
+        settings_dict = {**settings_dict}
+        options = {**settings_dict.get("OPTIONS", {})}
+        self.pragmas = {**PRAGMAS, **options.pop("pragmas", {})}
+        self.transaction_mode = options.pop(
+            "transaction_mode", "DEFERRED"
+        ).upper()
+        if self.transaction_mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f"transaction_mode должен быть одним из {TRANSACTION_MODES}."
+            )
+        self.busy_retries = options.pop("busy_retries", 3)
+        settings_dict["OPTIONS"] = options
+        settings_dict.setdefault("CONN_HEALTH_CHECKS", False)
+        super().__init__(settings_dict, *args, **kwargs)
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def create_cursor(self, name=None):
+        return self.connection.cursor(
+            factory=lambda conn: BusyRetryCursor(conn, self.busy_retries)
+        )
+
+    def is_usable(self):
+        try:
+            self.connection.execute("SELECT 1")
+        except base.Database.Error:
+            return False
+        return True
+
+    def close_if_unusable_or_obsolete(self):
+        # Django 2.2 проверяет соединение только после ошибок; с
+        # CONN_HEALTH_CHECKS долгое соединение проверяется всегда.
+        if (
+            self.connection is not None
+            and self.settings_dict["CONN_HEALTH_CHECKS"]
+            and not self.in_atomic_block
+        ):
+            self.errors_occurred = True
+        super().close_if_unusable_or_obsolete()
+
+    def _start_transaction_under_autocommit(self):
+        # IMMEDIATE берёт блокировку записи сразу, на BEGIN, где работает
+        # busy_timeout, а не посреди транзакции с ошибкой без ожидания.
+        self.cursor().execute(f"BEGIN {self.transaction_mode}")
@@ -0,0 +1,144 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import InvalidCacheBackendError, cache, caches
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.kvstores.base import KVStoreBase, add_prefix
+
+from .versions import fresh_version
+
+
+class LRU:
+    """Ограниченный по размеру словарь с вытеснением давних записей."""
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self.data[key]
+                return None
+            self.data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.size <= 0:
+            return
+        with self.lock:
+            self.data[key] = (time.monotonic() + self.timeout, value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.size:
+                self.data.popitem(last=False)
+
+    def delete(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+class KVStore(KVStoreBase):
+    """Хранилище sorl-thumbnail в кэше Django с локальным LRU перед ним.
+
+    Локально (THUMBNAIL_KVSTORE_L1_TIMEOUT, без согласования между
+    процессами) держатся только записи картинок: для одного ключа они
+    всегда одинаковы. Списки миниатюр изменяемые и читаются из кэша.
+
+    Кэш не умеет перечислять ключи, поэтому cleanup() ничего не находит,
+    а clear() сменяет поколение записей: старые уходят по таймауту.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.local = LRU(
+            settings.THUMBNAIL_KVSTORE_L1_SIZE,
+            settings.THUMBNAIL_KVSTORE_L1_TIMEOUT,
+        )
+
+    @property
+    def cache(self):
+        try:
+            return caches[sorl_settings.THUMBNAIL_CACHE]
+        except InvalidCacheBackendError:
+            return cache
+
+    @property
+    def generation_key(self):
+        return '||'.join([sorl_settings.THUMBNAIL_KEY_PREFIX, 'generation'])
+
+    def generation(self):
+        """Версия записей в кэше; другие процессы видят смену через L1."""
+        key = self.generation_key
+        value = self.local.get(key)
+        if value is None:
+            self.cache.add(key, fresh_version(), None)
+            value = self.cache.get(key)
+            self.local.set(key, value)
+        return value
+
+    def is_immutable(self, key):
+        return key.startswith(add_prefix(''))
+
+    def prefetch(self, image_files):
+        """Загружает записи миниатюр одним запросом к кэшу."""
+        keys = [add_prefix(image_file.key) for image_file in image_files]
+        missing = [key for key in keys if self.local.get(key) is None]
+        if not missing:
+            return 0
+        found = self.cache.get_many(missing, version=self.generation())
+        for key, value in found.items():
+            self.local.set(key, value)
+        return len(found)
+
+    def set_many_raw(self, data):
+        """Записывает готовые сериализованные значения, минуя L1."""
+        self.cache.set_many(
+            data,
+            sorl_settings.THUMBNAIL_CACHE_TIMEOUT,
+            version=self.generation(),
+        )
+
+    def clear(self):
+        try:
+            self.cache.incr(self.generation_key)
+        except ValueError:
+            self.cache.set(self.generation_key, fresh_version(), None)
+        self.local.clear()
+
+    def _get_raw(self, key):
+        value = self.local.get(key)
+        if value is None:
+            value = self.cache.get(key, version=self.generation())
+            if value is not None and self.is_immutable(key):
+                self.local.set(key, value)
+        return value
+
+    def _set_raw(self, key, value):
+        self.cache.set(
+            key,
+            value,
+            sorl_settings.THUMBNAIL_CACHE_TIMEOUT,
+            version=self.generation(),
+        )
+        if self.is_immutable(key):
+            self.local.set(key, value)
+
+    def _delete_raw(self, *keys):
+        self.cache.delete_many(keys, version=self.generation())
+        self.local.delete(*keys)
+
+    def _find_keys_raw(self, prefix):
+        return []
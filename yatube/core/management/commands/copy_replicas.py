@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.db.replicas import copy_to
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную SQLite-базу во все реплики из '
+        'REPLICA_DATABASES — для локальной проверки чтения с реплик.'
+    )
+
+    def handle(self, *args, **options):
+        if not settings.REPLICA_DATABASES:
+            raise CommandError('REPLICA_DATABASES пуст.')
+        for alias in settings.REPLICA_DATABASES:
+            copy_to(alias)
+            self.stdout.write(f'Скопировано в {alias}')
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+
+class Command(BaseCommand):
+    help = 'Переносит записи sorl-thumbnail из таблицы БД в кэш.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument(
+            '--delete',
+            action='store_true',
+            help='Удалить перенесённые строки из таблицы.',
+        )
+
+    def handle(self, *args, chunk_size, delete, **options):
+        kvstore = default.kvstore
+        if not hasattr(kvstore, 'set_many_raw'):
+            raise CommandError(
+                'THUMBNAIL_KVSTORE не поддерживает перенос записей.'
+            )
+        rows = KVStoreModel.objects.filter(
+            key__startswith=sorl_settings.THUMBNAIL_KEY_PREFIX
+        ).order_by('key')
+        last_key = None
+        moved = 0
+        while True:
+            chunk = rows if last_key is None else rows.filter(key__gt=last_key)
+            chunk = dict(chunk.values_list('key', 'value')[:chunk_size])
+            if not chunk:
+                break
+            kvstore.set_many_raw(chunk)
+            if delete:
+                KVStoreModel.objects.filter(key__in=chunk).delete()
+            moved += len(chunk)
+            last_key = max(chunk)
+        self.stdout.write(f'Перенесено записей: {moved}')
@@ -0,0 +1,103 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+from .db.replicas import pin
+from .versions import versions
+
+
+class CachePolicy:
+    def __init__(self, max_age, s_maxage=None, scopes=None, vary=('Cookie',)):
+        self.max_age = max_age
+        self.s_maxage = max_age if s_maxage is None else s_maxage
+        self.scopes = scopes
+        self.vary = vary
+
+    def scopes_for(self, view_kwargs):
+        if self.scopes is None:
+            return ()
+        return self.scopes(**view_kwargs)
+
+
+def cache_policy(max_age, s_maxage=None, scopes=None, vary=('Cookie',)):
+    """Объявляет политику кэширования страницы для анонимных GET.
+
+    scopes получает именованные аргументы view и возвращает области
+    данных, при изменении которых закэшированная страница устаревает.
+    """
+    policy = CachePolicy(max_age, s_maxage, scopes, vary)
+
+    def decorator(view_func):
+        view_func.cache_policy = policy
+        return view_func
+    return decorator
+
+
+class AnonymousPageCacheMiddleware:
+    """Кэш готовых ответов для анонимных GET и заголовки Cache-Control.
+
+    Страница хранится под ключом из адреса, строки запроса и версий
+    областей данных из политики view. Запросы с сессией и ответы,
+    которые ставят cookie или используют CSRF-токен, не кэшируются.
+    Страница, которая попадёт в кэш, собирается по основной базе, а не
+    по реплике: иначе новая версия получила бы данные до записи.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        policy = getattr(request, '_cache_policy', None)
+        if policy is None or getattr(request, '_page_cache_hit', False):
+            return response
+        if self.is_shared(request) and self.is_public(request, response):
+            patch_vary_headers(response, policy.vary)
+            patch_cache_control(
+                response,
+                public=True,
+                max_age=policy.max_age,
+                s_maxage=policy.s_maxage,
+            )
+            key = getattr(request, '_page_cache_key', None)
+            if key is not None and response.status_code == 200:
+                cache.set(key, response, settings.PAGE_CACHE_TIMEOUT)
+        else:
+            patch_cache_control(response, private=True)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        policy = getattr(view_func, 'cache_policy', None)
+        if policy is None:
+            return None
+        request._cache_policy = policy
+        if not (settings.PAGE_CACHE_ENABLED and self.is_shared(request)):
+            return None
+        parts = [request.build_absolute_uri()]
+        parts.extend(versions(*policy.scopes_for(view_kwargs)))
+        digest = hashlib.md5(
+            ':'.join(str(part) for part in parts).encode()
+        ).hexdigest()
+        request._page_cache_key = f'page:{digest}'
+        response = cache.get(request._page_cache_key)
+        request._page_cache_hit = response is not None
+        if response is None:
+            pin()
+        return response
+
+    def is_shared(self, request):
+        return (
+            request.method in ('GET', 'HEAD')
+            and not request.user.is_authenticated
+            and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        )
+
+    def is_public(self, request, response):
+        return (
+            response.status_code in (200, 304)
+            and not response.streaming
+            and not response.cookies
+            and not request.META.get('CSRF_COOKIE_USED')
+        )
@@ -0,0 +1,114 @@
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+SPACES = re.compile(r'\s+')
+
+
+def shape(sql):
+    """SQL без значений: одинаковые по смыслу запросы совпадают."""
+    return SPACES.sub(' ', IN_LIST.sub('IN (...)', sql)).strip()
+
+
+class QueryStats:
+    """Считает запросы ко всем базам через execute_wrapper.
+
+    В отличие от connection.queries работает и при DEBUG = False.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.shapes[shape(sql)] += 1
+
+    @property
+    def duplicates(self):
+        return {sql: n for sql, n in self.shapes.items() if n > 1}
+
+    @property
+    def repeats(self):
+        """Сколько запросов лишние: повторы уже выполненного."""
+        return sum(n - 1 for n in self.shapes.values())
+
+    @contextmanager
+    def record(self):
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(self)
+                )
+            yield self
+
+
+class QueryBudgetMiddleware:
+    """Число запросов, время SQL и повторы для каждого запроса к сайту.
+
+    Итог пишется строкой JSON в лог; при превышении QUERY_BUDGET —
+    с уровнем WARNING. С QUERY_STATS_HEADERS он же уходит в заголовки
+    X-DB-Queries, X-DB-Time (мс) и X-DB-Duplicates.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryStats().record() as stats:
+            response = self.get_response(request)
+        duration = round(stats.duration * 1000, 2)
+        over = stats.count > settings.QUERY_BUDGET
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': stats.count,
+            'sql_ms': duration,
+            'repeats': stats.repeats,
+        }
+        if over:
+            record['duplicates'] = stats.duplicates
+        logger.log(
+            logging.WARNING if over else logging.INFO,
+            json.dumps(record, ensure_ascii=False),
+        )
+        if settings.QUERY_STATS_HEADERS:
+            response['X-DB-Queries'] = stats.count
+            response['X-DB-Time'] = duration
+            response['X-DB-Duplicates'] = stats.repeats
+        return response
+
+
+@contextmanager
+def query_budget(max_queries, max_duplicates=None):
+    """Падает AssertionError, если блок сделал больше запросов, чем можно.
+
+        with query_budget(5, max_duplicates=0):
+            client.get('/')
+    """
+    with QueryStats().record() as stats:
+        yield stats
+    problems = []
+    if stats.count > max_queries:
+        problems.append(f'запросов {stats.count}, бюджет {max_queries}')
+    if max_duplicates is not None and stats.repeats > max_duplicates:
+        problems.append(f'повторов {stats.repeats}, бюджет {max_duplicates}')
+    if problems:
+        lines = [f'{n} x {sql}' for sql, n in stats.shapes.most_common()]
+        raise AssertionError('; '.join(problems) + '\n' + '\n'.join(lines))
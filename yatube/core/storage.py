@@ -0,0 +1,97 @@
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import StoredFile
+
+HASHED_NAME = re.compile(
+    r'(?:^|/)([0-9a-f]{2})/([0-9a-f]{2})/\1\2[0-9a-f]{60}'
+)
+
+
+def is_hashed(name):
+    return bool(HASHED_NAME.search(name))
+
+
+def retain(name, count=1):
+    """Ещё count ссылок на файл.
+
+    Кто ставит в модель уже сохранённое имя в обход save() файла
+    (bulk_create, update()), сам берёт на него ссылку.
+    """
+    stored = StoredFile.objects.filter(name=name)
+    if stored.update(refs=F('refs') + count):
+        return
+    try:
+        with transaction.atomic():
+            StoredFile.objects.create(name=name, refs=count)
+    except IntegrityError:
+        stored.update(refs=F('refs') + count)
+
+
+class HashedStorage(FileSystemStorage):
+    """Файлы по SHA-256 содержимого: posts/ab/cd/abcd….jpg.
+
+    Хэш считается по ходу записи во временный файл, два уровня
+    подкаталогов держат каталоги маленькими. Одинаковое содержимое
+    хранится один раз: StoredFile считает ссылки, delete() снимает
+    одну и удаляет файл вместе с последней. Файлы, которых нет в
+    StoredFile (загруженные до перехода), delete() не трогает.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Имя всё равно заменит хэш, проверять занятость незачем.
+        return name
+
+    def hashed_name(self, name, digest):
+        directory = posixpath.dirname(name)
+        extension = posixpath.splitext(name)[1].lower()
+        return posixpath.join(
+            directory, digest[:2], digest[2:4], digest + extension
+        )
+
+    def _save(self, name, content):
+        os.makedirs(self.location, exist_ok=True)
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(
+            dir=self.location, prefix='.upload-', delete=False
+        ) as temp:
+            try:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp.write(chunk)
+            except BaseException:
+                os.unlink(temp.name)
+                raise
+        name = self.hashed_name(name, digest.hexdigest())
+        path = self.path(name)
+        # Сначала ссылка, потом файл: параллельный delete() последней
+        # ссылки либо увидит новую, либо удалит файл до того, как он
+        # будет положен заново. Ссылка берётся в транзакции вызывающего
+        # (Post.save() атомарен) и откатывается вместе с ней.
+        retain(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.chmod(temp.name, self.file_permissions_mode or 0o644)
+        os.replace(temp.name, path)
+        return name
+
+    def delete(self, name):
+        with transaction.atomic():
+            stored = StoredFile.objects.select_for_update().filter(
+                name=name
+            ).first()
+            if stored is None:
+                return
+            if stored.refs > 1:
+                StoredFile.objects.filter(name=name).update(
+                    refs=F('refs') - 1
+                )
+                return
+            stored.delete()
+            super().delete(name)
@@ -0,0 +1,86 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory, TransactionTestCase, override_settings
+)
+from django.urls import reverse
+
+from core.db.replicas import PrimaryPinMiddleware, copy_to, primary, reset
+from posts.models import Group, Post, User
+
+
+@override_settings(REPLICA_DATABASES=['replica'])
+class ReplicaRoutingTest(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        connections.databases['replica'] = {
+            **connections.databases['default'],
+            'NAME': f'{cls.directory}/replica.sqlite3',
+        }
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections.databases['replica']
+        del connections._connections.replica
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user(username='author')
+        Post.objects.create(text='Старый', author=author)
+        copy_to('replica')
+        self.fresh = Post.objects.create(text='Новый', author=author)
+        reset()
+
+    def test_reads_go_to_replica_unless_pinned(self):
+        self.assertFalse(Post.objects.filter(pk=self.fresh.pk).exists())
+        self.assertEqual(Post.objects.count(), 1)
+        with primary():
+            self.assertTrue(Post.objects.filter(pk=self.fresh.pk).exists())
+
+    def test_write_pins_the_rest_of_the_thread(self):
+        Group.objects.create(title='Группа', slug='group')
+        self.assertTrue(Post.objects.filter(pk=self.fresh.pk).exists())
+
+    def test_pin_cookie_reads_primary(self):
+        url = reverse('posts:post_detail', args=[self.fresh.pk])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.cookies[settings.PRIMARY_PIN_COOKIE] = '1'
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_cached_pages_are_built_from_primary(self):
+        for enabled in (False, True):
+            with self.subTest(page_cache=enabled):
+                cache.clear()
+                with override_settings(PAGE_CACHE_ENABLED=enabled):
+                    response = self.client.get(reverse('posts:index'))
+                    self.assertContains(response, 'Новый')
+                    # Повторный ответ из кэша тоже свежий.
+                    response = self.client.get(reverse('posts:index'))
+                    self.assertContains(response, 'Новый')
+
+    def test_middleware_sets_cookie_only_after_write(self):
+        def reader(request):
+            list(Post.objects.all())
+            return HttpResponse()
+
+        def writer(request):
+            Group.objects.create(title='Группа', slug='group')
+            return HttpResponse()
+
+        request = RequestFactory().get('/')
+        response = PrimaryPinMiddleware(reader)(request)
+        self.assertNotIn(settings.PRIMARY_PIN_COOKIE, response.cookies)
+        response = PrimaryPinMiddleware(writer)(request)
+        self.assertIn(settings.PRIMARY_PIN_COOKIE, response.cookies)
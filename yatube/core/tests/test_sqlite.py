@@ -0,0 +1,77 @@
+import os
+import sqlite3
+import tempfile
+import threading
+
+from django.db import OperationalError
+from django.test import SimpleTestCase
+
+from core.db.sqlite3.base import DatabaseWrapper
+
+
+class SQLiteBackendTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'db.sqlite3')
+        with sqlite3.connect(self.path) as conn:
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('CREATE TABLE item (id INTEGER PRIMARY KEY)')
+
+    def wrapper(self, **options):
+        database = DatabaseWrapper({
+            'ENGINE': 'core.db.sqlite3',
+            'NAME': self.path,
+            'OPTIONS': options,
+            'AUTOCOMMIT': True,
+            'ATOMIC_REQUESTS': False,
+            'CONN_MAX_AGE': 600,
+            'CONN_HEALTH_CHECKS': True,
+            'TIME_ZONE': None,
+        }, alias='probe')
+        self.addCleanup(database.close)
+        return database
+
+    def pragma(self, database, name):
+        with database.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied(self):
+        database = self.wrapper(pragmas={'cache_size': -1234})
+        self.assertEqual(self.pragma(database, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(database, 'synchronous'), 1)
+        self.assertEqual(self.pragma(database, 'cache_size'), -1234)
+        self.assertEqual(self.pragma(database, 'busy_timeout'), 5000)
+
+    def test_health_check_drops_broken_connection(self):
+        database = self.wrapper()
+        database.ensure_connection()
+        database.close_if_unusable_or_obsolete()
+        self.assertIsNotNone(database.connection)
+        database.connection.close()
+        database.close_if_unusable_or_obsolete()
+        self.assertIsNone(database.connection)
+
+    def test_busy_database_is_retried(self):
+        holder = sqlite3.connect(
+            self.path, isolation_level=None, check_same_thread=False
+        )
+        self.addCleanup(holder.close)
+        holder.execute('BEGIN IMMEDIATE')
+        threading.Timer(0.1, holder.execute, ('COMMIT',)).start()
+        database = self.wrapper(busy_retries=5, pragmas={'busy_timeout': 0})
+        with database.cursor() as cursor:
+            cursor.execute('INSERT INTO item DEFAULT VALUES')
+            cursor.execute('SELECT COUNT(*) FROM item')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_busy_without_retries_fails(self):
+        holder = sqlite3.connect(self.path, isolation_level=None)
+        self.addCleanup(holder.close)
+        holder.execute('BEGIN IMMEDIATE')
+        database = self.wrapper(busy_retries=0, pragmas={'busy_timeout': 0})
+        with self.assertRaises(OperationalError):
+            with database.cursor() as cursor:
+                cursor.execute('INSERT INTO item DEFAULT VALUES')
+        holder.execute('ROLLBACK')
@@ -0,0 +1,55 @@
+import os
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+
+from core.models import StoredFile
+from core.storage import HashedStorage, is_hashed
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class HashedStorageTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.storage = HashedStorage()
+
+    def test_identical_content_is_stored_once(self):
+        first = self.storage.save('posts/a.JPG', ContentFile(b'same'))
+        second = self.storage.save('posts/b.jpg', ContentFile(b'same'))
+        other = self.storage.save('posts/c.jpg', ContentFile(b'other'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertTrue(is_hashed(first))
+        directory, digest = first.rsplit('/', 1)
+        self.assertEqual(directory, f'posts/{digest[:2]}/{digest[2:4]}')
+        self.assertTrue(digest.endswith('.jpg'))
+        self.assertEqual(StoredFile.objects.get(name=first).refs, 2)
+        self.assertEqual(
+            [name for name in os.listdir(TEMP_MEDIA_ROOT)
+             if name.startswith('.upload-')],
+            [],
+        )
+
+    def test_file_deleted_with_last_reference(self):
+        name = self.storage.save('posts/a.jpg', ContentFile(b'shared'))
+        self.storage.save('posts/b.jpg', ContentFile(b'shared'))
+        self.storage.delete(name)
+        self.assertTrue(self.storage.exists(name))
+        self.storage.delete(name)
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+
+    def test_untracked_files_are_kept(self):
+        path = os.path.join(TEMP_MEDIA_ROOT, 'legacy.jpg')
+        with open(path, 'wb') as legacy:
+            legacy.write(b'old')
+        self.storage.delete('legacy.jpg')
+        self.assertTrue(os.path.exists(path))
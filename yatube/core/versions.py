@@ -0,0 +1,33 @@
+import time
+
+from django.core.cache import cache
+
+
+def version_key(scope):
+    return f'version:{scope}'
+
+
+def fresh_version():
+    # Версия от времени: после вытеснения ключа версии старые записи
+    # кэша не совпадут с новой версией.
+    return int(time.time() * 1000)
+
+
+def versions(*scopes):
+    """Текущие версии областей данных одним обращением к кэшу."""
+    keys = [version_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    missing = {key: fresh_version() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def bump(*scopes):
+    for scope in scopes:
+        key = version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, fresh_version(), None)
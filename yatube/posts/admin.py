@@ -1,6 +1,8 @@
 from django.contrib import admin
 
 from .models import Comment, Post, Group
+from .paginators import EstimatedCountPaginator
+from .search import matching
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -12,11 +14,50 @@ class PostAdmin(admin.ModelAdmin):
         "group",
     )
     list_editable = ("group",)
+    list_select_related = ("author", "group")
     search_fields = ("text",)
     list_filter = ("pub_date",)
+    date_hierarchy = "pub_date"
+    raw_id_fields = ("author",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    empty_value_display = "-пусто-"
+
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск идёт по полнотекстовому индексу, а не LIKE по text.
+        if not search_term:
+            return queryset, False
+        return matching(queryset, search_term), False
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        formfield = super().formfield_for_foreignkey(
+            db_field, request, **kwargs
+        )
+        if db_field.name == "group":
+            # Список групп читается один раз на запрос, а не в каждой
+            # строке list_editable.
+            if not hasattr(request, "_group_choices"):
+                request._group_choices = list(formfield.choices)
+            formfield.choices = request._group_choices
+        return formfield
+
+
+class CommentAdmin(admin.ModelAdmin):
+    list_display = (
+        "pk",
+        "text",
+        "created",
+        "author",
+        "post",
+    )
+    list_select_related = ("author", "post")
+    date_hierarchy = "created"
+    raw_id_fields = ("author", "post")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = "-пусто-"
 
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
-admin.site.register(Comment)
+admin.site.register(Comment, CommentAdmin)
@@ -0,0 +1,152 @@
+import json
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET
+
+from .models import Group, Post, User
+from .paginators import InvalidCursor, decode_cursor, encode_cursor
+from .timeline import timeline_posts
+
+# Поле ответа -> колонка для values(); JOIN появляется только по запросу.
+FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+    'comments_count': 'comments_count',
+}
+DEFAULT_FIELDS = ('id', 'text', 'pub_date', 'author', 'group')
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def error(message, status=400):
+    return JsonResponse(
+        {'error': message},
+        status=status,
+        json_dumps_params={'ensure_ascii': False},
+    )
+
+
+def requested_fields(request):
+    raw = request.GET.get('fields')
+    if not raw:
+        return DEFAULT_FIELDS
+    fields = tuple(name.strip() for name in raw.split(',') if name.strip())
+    unknown = sorted(set(fields) - set(FIELDS))
+    if unknown:
+        raise BadRequest(
+            f'Неизвестные поля: {", ".join(unknown)}. '
+            f'Доступны: {", ".join(FIELDS)}.'
+        )
+    return fields
+
+
+def requested_limit(request):
+    try:
+        limit = int(request.GET.get('limit', settings.API_PAGE_SIZE))
+    except ValueError:
+        raise BadRequest('limit должен быть числом.')
+    return max(1, min(limit, settings.API_MAX_PAGE_SIZE))
+
+
+def serialize(row, fields):
+    item = {name: row[FIELDS[name]] for name in fields}
+    if 'image' in item:
+        item['image'] = (
+            default_storage.url(item['image']) if item['image'] else None
+        )
+    return item
+
+
+def stream(queryset, fields, after, limit, date_field='pub_date'):
+    """Строки NDJSON: по посту на строку, в конце — курсор, если есть ещё.
+
+    Посты читаются через iterator(), поэтому память не растёт с limit.
+    """
+    if after:
+        moment, pk = decode_cursor(after)
+        queryset = queryset.filter(
+            Q(**{f'{date_field}__lt': moment})
+            | Q(**{date_field: moment, 'pk__lt': pk})
+        )
+    columns = {FIELDS[name] for name in fields} | {'id', date_field}
+    rows = queryset.order_by(f'-{date_field}', '-pk').values(
+        *sorted(columns)
+    )[:limit + 1]
+
+    def lines():
+        last = None
+        for count, row in enumerate(rows.iterator(), start=1):
+            if count > limit:
+                cursor = encode_cursor(last[date_field], last['id'])
+                yield json.dumps({'next': cursor}) + '\n'
+                return
+            last = row
+            yield json.dumps(
+                serialize(row, fields), cls=DjangoJSONEncoder,
+                ensure_ascii=False,
+            ) + '\n'
+
+    return lines()
+
+
+def export(request, queryset, date_field='pub_date'):
+    try:
+        lines = stream(
+            queryset,
+            requested_fields(request),
+            request.GET.get('after'),
+            requested_limit(request),
+            date_field,
+        )
+    except InvalidCursor:
+        return error('Испорченный курсор.')
+    except BadRequest as exc:
+        return error(str(exc))
+    return StreamingHttpResponse(
+        lines, content_type='application/x-ndjson; charset=utf-8'
+    )
+
+
+@require_GET
+def post(request, post_id):
+    try:
+        fields = requested_fields(request)
+    except BadRequest as exc:
+        return error(str(exc))
+    columns = sorted({FIELDS[name] for name in fields})
+    row = get_object_or_404(Post.objects.values(*columns), pk=post_id)
+    return JsonResponse(
+        serialize(row, fields), json_dumps_params={'ensure_ascii': False}
+    )
+
+
+@require_GET
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return export(request, Post.objects.filter(group=group))
+
+
+@require_GET
+def author_posts(request, username):
+    author = get_object_or_404(User, username=username)
+    return export(request, Post.objects.filter(author=author))
+
+
+@require_GET
+def follow_posts(request):
+    if not request.user.is_authenticated:
+        return error('Нужна авторизация.', status=401)
+    return export(
+        request, timeline_posts(request.user), date_field='timeline_date'
+    )
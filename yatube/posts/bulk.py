@@ -0,0 +1,28 @@
+from contextlib import contextmanager
+
+
+@contextmanager
+def manual_dates(*fields):
+    """Отключает auto_now/auto_now_add, чтобы даты можно было задать."""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def fill_pks(model, objects):
+    """Проставляет id объектам после bulk_create, если база их не вернула.
+
+    SQLite не отдаёт id из многострочного INSERT. Внутри транзакции
+    после вставки таблица заблокирована на запись, поэтому последние
+    len(objects) строк — ровно наши, в порядке вставки.
+    """
+    if not objects or objects[0].pk is not None:
+        return
+    pks = model.objects.order_by('-pk').values_list('pk', flat=True)
+    for obj, pk in zip(objects, reversed(list(pks[:len(objects)]))):
+        obj.pk = pk
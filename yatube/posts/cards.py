@@ -0,0 +1,65 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from .thumbnails import prefetch
+
+TEMPLATE = 'includes/post.html'
+# Поднимается при правке шаблона карточки: старые ключи перестают читаться.
+CARD_VERSION = 2
+
+
+def card_key(post):
+    """Ключ карточки из всего, что в ней показано.
+
+    Правка поста меняет updated, переименование автора или группы —
+    их поля, поэтому старая карточка просто перестаёт читаться.
+    Картинку и HTML текста меняют и в обход updated (migrate_media,
+    render_post_text), поэтому они в ключе сами по себе.
+    """
+    author = post.author
+    group = post.group
+    parts = [
+        CARD_VERSION,
+        post.updated.isoformat(),
+        post.image.name,
+        post.text_html,
+        post.comments_count,
+        author.username,
+        author.first_name,
+        author.last_name,
+    ]
+    if group is not None:
+        parts.extend((group.slug, group.title))
+    digest = hashlib.md5(
+        '\x00'.join(str(part) for part in parts).encode()
+    ).hexdigest()
+    return f'card:{post.pk}:{digest}'
+
+
+def render_cards(posts):
+    """HTML карточек по id поста.
+
+    Готовые читаются из кэша одним get_many, недостающие рендерятся
+    и кладутся туда одним set_many.
+    """
+    posts = list(posts)
+    keys = [card_key(post) for post in posts]
+    cards = cache.get_many(keys)
+    missing = [
+        (key, post) for key, post in zip(keys, posts) if key not in cards
+    ]
+    if missing:
+        prefetch([post for _, post in missing])
+        template = get_template(TEMPLATE)
+        rendered = {
+            key: template.render({'post': post}) for key, post in missing
+        }
+        cache.set_many(rendered, settings.POST_CARD_CACHE_TIMEOUT)
+        cards.update(rendered)
+    return {
+        post.pk: mark_safe(cards[key]) for key, post in zip(keys, posts)
+    }
@@ -0,0 +1,82 @@
+import hashlib
+
+from django.views.decorators.http import condition
+
+from core.versions import versions
+
+from .feed_cache import author_scope, group_scope
+from .followees import followee_ids
+from .models import Group, Post, User
+
+
+def conditional(state_func):
+    """condition() с ETag и Last-Modified из одного лёгкого запроса.
+
+    state_func(request, **kwargs) возвращает (время последнего изменения
+    или None, строку с прочим состоянием страницы) или None, если объекта
+    нет. Без времени отдаётся только ETag.
+    """
+    def state(request, **kwargs):
+        if not hasattr(request, '_conditional_state'):
+            request._conditional_state = state_func(request, **kwargs)
+        return request._conditional_state
+
+    def etag(request, **kwargs):
+        found = state(request, **kwargs)
+        if found is None:
+            return None
+        last_modified, extra = found
+        raw = f'{last_modified}:{extra}:{request.user.pk}'
+        return hashlib.md5(raw.encode()).hexdigest()
+
+    def last_modified(request, **kwargs):
+        found = state(request, **kwargs)
+        return found[0] if found else None
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def post_state(request, post_id):
+    updated = Post.objects.filter(pk=post_id).values_list(
+        'updated', flat=True
+    ).first()
+    return None if updated is None else (updated, '')
+
+
+# Ленты автора и группы меняются и без нового updated: пост удалили или
+# перенесли в другую группу. Такие записи поднимают версию области кэша,
+# поэтому состояние — счётчики плюс версия, а Last-Modified не отдаётся.
+
+def profile_state(request, username):
+    author = User.objects.filter(username=username).values(
+        'pk',
+        'counters__posts_count',
+        'counters__followers_count',
+        'counters__following_count',
+    ).first()
+    if author is None:
+        return None
+    following = (
+        request.user.is_authenticated
+        and author['pk'] in followee_ids(request.user.pk)
+    )
+    extra = ':'.join(str(author[key]) for key in (
+        'counters__posts_count',
+        'counters__followers_count',
+        'counters__following_count',
+    ))
+    version, = versions(author_scope(username))
+    return None, f'{extra}:{following}:{version}'
+
+
+def group_state(request, slug):
+    group = Group.objects.filter(slug=slug).values(
+        'posts_count', 'title', 'description'
+    ).first()
+    if group is None:
+        return None
+    version, = versions(group_scope(slug))
+    extra = (
+        f"{group['posts_count']}:{group['title']}:{group['description']}"
+    )
+    return None, f'{extra}:{version}'
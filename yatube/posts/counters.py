@@ -0,0 +1,44 @@
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Group, Post, UserCounters
+
+
+def bump(queryset, field, delta, **changes):
+    """Атомарно сдвигает счётчик; не опускает его ниже нуля."""
+    queryset.update(**{field: Greatest(F(field) + delta, 0)}, **changes)
+
+
+def bump_user(user_id, field, delta):
+    bump(UserCounters.objects.filter(user_id=user_id), field, delta)
+
+
+def bump_group(group_id, delta):
+    if group_id is not None:
+        bump(Group.objects.filter(pk=group_id), 'posts_count', delta)
+
+
+def bump_post(post_id, delta):
+    bump(
+        Post.objects.filter(pk=post_id),
+        'comments_count',
+        delta,
+        updated=timezone.now(),
+    )
+
+
+def user_counters(user):
+    """Счётчики пользователя; отсутствующая строка пересчитывается."""
+    try:
+        return user.counters
+    except UserCounters.DoesNotExist:
+        counters, _ = UserCounters.objects.get_or_create(
+            user=user,
+            defaults={
+                'posts_count': user.posts.count(),
+                'followers_count': user.following.count(),
+                'following_count': user.follower.count(),
+            },
+        )
+        return counters
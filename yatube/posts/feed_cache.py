@@ -0,0 +1,75 @@
+from django.conf import settings
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.utils import make_template_fragment_key
+
+from core.db.replicas import pin
+from core.versions import versions
+
+from .models import Group
+
+FEED = 'feed'
+PAGE_PARAMS = ('page', 'after', 'before')
+
+
+def group_scope(slug):
+    return f'group:{slug}'
+
+
+def author_scope(username):
+    return f'author:{username}'
+
+
+def follow_scope(user_id):
+    return f'follow:{user_id}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def feed_context(request, view, *scopes):
+    """Ключ и время жизни фрагмента ленты для {% cache %}.
+
+    Ключ состоит из затронутых областей, их версий и позиции в ленте,
+    поэтому любая запись в пост, комментарий или группу делает его новым.
+    Версии разных областей могут совпасть, поэтому в ключе и сами области.
+    Если фрагмента ещё нет, запрос дальше читает основную базу: HTML
+    с отстающей реплики остался бы под новой версией до следующей записи.
+    Вызывать до выборки постов ленты.
+    """
+    parts = [view, request.user.is_authenticated]
+    parts.extend(scopes)
+    parts.extend(versions(*scopes))
+    parts.extend(request.GET.get(param, '') for param in PAGE_PARAMS)
+    key = ':'.join(str(part) for part in parts)
+    if fragment_cache().get(make_template_fragment_key('feed', [key])) is None:
+        pin()
+    return {
+        'feed_key': key,
+        'feed_timeout': settings.FEED_CACHE_TIMEOUT,
+    }
+
+
+def fragment_cache():
+    """Кэш, в котором {% cache %} хранит фрагменты."""
+    try:
+        return caches['template_fragments']
+    except InvalidCacheBackendError:
+        return caches['default']
+
+
+def post_scopes(post, *slugs):
+    """Версии, которые устаревают при изменении поста.
+
+    Автор и группа берутся из объектов поста: если они уже загружены,
+    запросов нет. slugs — прежние группы поста.
+    """
+    scopes = [FEED, post_scope(post.pk), author_scope(post.author.username)]
+    if post.group_id is not None:
+        group = post.group
+        if group.pk != post.group_id:
+            # group_id сменили напрямую, загруженная группа устарела.
+            group = Group.objects.get(pk=post.group_id)
+        slugs += (group.slug,)
+    scopes.extend(group_scope(slug) for slug in set(slugs) if slug)
+    return scopes
@@ -0,0 +1,26 @@
+from .models import Post
+
+# Колонки, которые читает карточка поста (includes/post.html).
+CARD_FIELDS = (
+    'id',
+    'text',
+    'text_html',
+    'pub_date',
+    'updated',
+    'image',
+    'comments_count',
+    'author',
+    'author__username',
+    'author__first_name',
+    'author__last_name',
+    'group',
+    'group__slug',
+    'group__title',
+)
+
+
+def feed_posts(queryset=None):
+    """Посты для лент: автор и группа одним JOIN, только нужные колонки."""
+    if queryset is None:
+        queryset = Post.objects.all()
+    return queryset.select_related('author', 'group').only(*CARD_FIELDS)
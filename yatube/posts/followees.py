@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Follow
+
+
+def cache_key(user_id):
+    return f'posts:followees:{user_id}'
+
+
+def followee_ids(user_id):
+    """Множество id авторов, на которых подписан пользователь."""
+    key = cache_key(user_id)
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(
+            Follow.objects.filter(user_id=user_id).values_list(
+                'author', flat=True
+            )
+        )
+        cache.set(key, ids, settings.FOLLOWEES_CACHE_TIMEOUT)
+    return ids
+
+
+def is_following(user, author):
+    return user.is_authenticated and author.pk in followee_ids(user.pk)
+
+
+def invalidate(user_id):
+    cache.delete(cache_key(user_id))
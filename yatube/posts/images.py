@@ -0,0 +1,81 @@
+import os
+import tempfile
+
+from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image, ImageOps
+
+# Анимированные GIF при пересохранении потеряют кадры.
+KEEP_FORMATS = ('GIF',)
+ORIENTATION = 0x0112
+# Что Pillow бросает на битых, обрезанных и слишком больших файлах.
+DECODE_ERRORS = (
+    OSError, SyntaxError, ValueError, Image.DecompressionBombError
+)
+
+
+def has_alpha(image):
+    return image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+
+
+def normalize(upload):
+    """Приводит загруженную картинку к виду, в котором её хранит сайт.
+
+    Картинка поворачивается по EXIF, уменьшается до POST_IMAGE_MAX_SIZE
+    и пересохраняется с качеством POST_IMAGE_QUALITY без метаданных.
+    JPEG декодируется сразу в уменьшенном масштабе (draft), поэтому
+    полноразмерная копия в памяти не создаётся. Результат пишется во
+    временный файл, который при большом размере уходит на диск.
+    Файл, который Pillow не смог прочитать, — ошибка формы.
+    """
+    try:
+        return reencode(upload)
+    except DECODE_ERRORS:
+        raise forms.ValidationError(
+            forms.ImageField.default_error_messages['invalid_image'],
+            code='invalid_image',
+        )
+
+
+def reencode(upload):
+    upload.seek(0)
+    image = Image.open(upload)
+    if image.format in KEEP_FORMATS:
+        upload.seek(0)
+        return upload
+    max_size = settings.POST_IMAGE_MAX_SIZE
+    longest = max(max_size)
+    image.draft('RGB', (longest, longest))
+    if image.getexif().get(ORIENTATION, 1) != 1:
+        image = ImageOps.exif_transpose(image)
+    image.thumbnail(max_size, Image.LANCZOS)
+    if has_alpha(image):
+        fmt, extension, options = 'PNG', 'png', {'optimize': True}
+        image = image.convert('RGBA')
+    else:
+        fmt, extension, options = 'JPEG', 'jpg', {
+            'quality': settings.POST_IMAGE_QUALITY,
+            'optimize': True,
+            'progressive': True,
+        }
+        image = image.convert('RGB')
+    icc_profile = image.info.get('icc_profile')
+    if icc_profile:
+        options['icc_profile'] = icc_profile
+    output = tempfile.SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+    )
+    image.save(output, fmt, **options)
+    image.close()
+    size = output.tell()
+    output.seek(0)
+    name = os.path.splitext(os.path.basename(upload.name))[0]
+    return UploadedFile(
+        file=output,
+        name=f'{name}.{extension}',
+        content_type=f'image/{fmt.lower()}',
+        size=size,
+    )
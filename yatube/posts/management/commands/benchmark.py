@@ -0,0 +1,127 @@
+import json
+import math
+import time
+import tracemalloc
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+from core.query_budget import QueryStats
+from posts.models import Comment, Group, Post, User
+from posts.urls import app_name, urlpatterns
+
+# Эти адреса меняют данные даже на GET.
+SKIP = {'add_comment', 'profile_follow', 'profile_unfollow'}
+
+
+def percentile(values, share):
+    """Процентиль методом ближайшего ранга."""
+    ordered = sorted(values)
+    # round() отсекает хвост вроде 0.07 * 100 = 7.000000000000001.
+    index = max(0, math.ceil(round(share * len(ordered), 9)) - 1)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет view из posts/urls.py в процессе: задержку p50/p95/p99, '
+        'число запросов и пик памяти. Итог — JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument(
+            '--cold',
+            action='store_true',
+            help='Очищать кэш перед каждым запросом.',
+        )
+        parser.add_argument('--only', nargs='*', default=None)
+        parser.add_argument('--output', default=None)
+
+    def handle(self, *args, repeat, warmup, cold, only, output, **options):
+        reader = User.objects.order_by(
+            '-counters__following_count'
+        ).first()
+        if reader is None or not Post.objects.exists():
+            raise CommandError('База пуста: сначала запустите seed_data.')
+        client = Client()
+        client.force_login(reader)
+        results = {}
+        for name, url in self.targets(reader):
+            if only and name not in only:
+                continue
+            results[name] = self.measure(client, url, repeat, warmup, cold)
+        report = json.dumps({
+            'repeat': repeat,
+            'cold': cold,
+            'reader': reader.username,
+            'results': results,
+        }, ensure_ascii=False, indent=2)
+        if output:
+            with open(output, 'w') as out:
+                out.write(report)
+        self.stdout.write(report)
+
+    def targets(self, reader):
+        post = Post.objects.order_by('-comments_count').first()
+        author = User.objects.order_by('-counters__posts_count').first()
+        group = Group.objects.order_by('-posts_count').first()
+        own_post = Post.objects.filter(author=reader).first() or post
+        kwargs = {
+            'username': author.username,
+            'slug': group.slug if group else '',
+            'post_id': post.pk,
+        }
+        for pattern in urlpatterns:
+            if pattern.name in SKIP:
+                continue
+            params = {
+                key: kwargs[key] for key in pattern.pattern.converters
+            }
+            if pattern.name == 'post_edit':
+                params['post_id'] = own_post.pk
+            url = reverse(f'{app_name}:{pattern.name}', kwargs=params)
+            if pattern.name == 'search':
+                word = Comment.objects.values_list('text', flat=True).first()
+                url += f'?q={(word or post.text).split()[0]}'
+            yield pattern.name, url
+
+    def fetch(self, client, url):
+        response = client.get(url)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response.status_code
+
+    def measure(self, client, url, repeat, warmup, cold):
+        for _ in range(warmup):
+            self.fetch(client, url)
+        timings = []
+        queries = []
+        status = None
+        for _ in range(repeat):
+            if cold:
+                cache.clear()
+            with QueryStats().record() as stats:
+                start = time.perf_counter()
+                status = self.fetch(client, url)
+                timings.append((time.perf_counter() - start) * 1000)
+            queries.append(stats.count)
+        if cold:
+            cache.clear()
+        tracemalloc.start()
+        self.fetch(client, url)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {
+            'url': url,
+            'status': status,
+            'p50_ms': round(percentile(timings, 0.50), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+            'p99_ms': round(percentile(timings, 0.99), 2),
+            'mean_ms': round(sum(timings) / len(timings), 2),
+            'queries': max(queries),
+            'peak_kb': round(peak / 1024, 1),
+        }
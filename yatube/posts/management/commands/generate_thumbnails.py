@@ -0,0 +1,94 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import generate
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт миниатюры для всех картинок постов. '
+        'Прогресс сохраняется, прерванный запуск продолжается с места, '
+        'посты с ошибками повторяются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--chunk-size', type=int, default=100)
+        parser.add_argument(
+            '--state-file',
+            default=os.path.join(settings.MEDIA_ROOT, '.thumbnails_state'),
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Начать с первого поста, игнорируя сохранённый прогресс.',
+        )
+
+    def handle(self, *args, workers, chunk_size, state_file, restart,
+               **options):
+        self.state_file = state_file
+        last_pk, retry = (0, []) if restart else self.read_state(state_file)
+        posts = Post.objects.exclude(image='').order_by('pk')
+        self.done = 0
+        self.failed = set(retry)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # Упавшие в прошлый раз посты не считаются сделанными.
+            for start in range(0, len(retry), chunk_size):
+                pks = retry[start:start + chunk_size]
+                self.failed.difference_update(pks)
+                chunk = list(posts.filter(pk__in=pks).values_list(
+                    'pk', 'image'
+                ))
+                self.process(pool, chunk, last_pk)
+            while True:
+                chunk = list(
+                    posts.filter(pk__gt=last_pk).values_list(
+                        'pk', 'image'
+                    )[:chunk_size]
+                )
+                if not chunk:
+                    break
+                last_pk = chunk[-1][0]
+                self.process(pool, chunk, last_pk)
+                self.stdout.write(f'Готово до поста {last_pk}')
+        self.stdout.write(
+            f'Обработано: {self.done}, ошибок: {len(self.failed)}'
+        )
+
+    def process(self, pool, chunk, last_pk):
+        results = pool.map(generate, [name for _, name in chunk])
+        for (pk, _), ok in zip(chunk, results):
+            if ok:
+                self.done += 1
+            else:
+                self.failed.add(pk)
+        self.write_state(last_pk)
+
+    def read_state(self, path):
+        """Последний пройденный id и id постов, которые стоит повторить."""
+        try:
+            with open(path) as state:
+                data = json.load(state)
+        except (OSError, ValueError):
+            return 0, []
+        if isinstance(data, int):
+            return data, []
+        try:
+            return int(data['last_pk']), [int(pk) for pk in data['failed']]
+        except (KeyError, TypeError, ValueError):
+            return 0, []
+
+    def write_state(self, last_pk):
+        path = self.state_file
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as state:
+            json.dump(
+                {'last_pk': last_pk, 'failed': sorted(self.failed)}, state
+            )
+        os.replace(tmp_path, path)
@@ -0,0 +1,325 @@
+import csv
+import io
+import json
+import sys
+import time
+from collections import Counter
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.storage import is_hashed, retain
+from core.versions import bump
+from posts import counters, search, timeline
+from posts.bulk import fill_pks, manual_dates
+from posts.feed_cache import FEED, author_scope, group_scope
+from posts.models import (
+    Comment, Follow, Group, Post, User, UserCounters
+)
+
+
+class InvalidRecord(ValueError):
+    pass
+
+
+POST_FIELDS = ('text', 'author', 'group', 'pub_date', 'image')
+COMMENT_FIELDS = ('author', 'text', 'created')
+
+
+def parse_date(value):
+    if not value:
+        return timezone.now()
+    try:
+        moment = parse_datetime(value)
+    except ValueError:
+        moment = None
+    if moment is None:
+        raise InvalidRecord(f'неверная дата {value!r}')
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def check_fields(record, fields):
+    for field in fields:
+        value = record.get(field)
+        if value is not None and not isinstance(value, str):
+            raise InvalidRecord(f'{field} — не строка')
+
+
+def validate(record):
+    """Проверяет форму записи до того, как она попадёт в пачку."""
+    if not isinstance(record, dict):
+        raise InvalidRecord('запись — не объект')
+    check_fields(record, POST_FIELDS)
+    comments = record.get('comments') or []
+    if not isinstance(comments, list):
+        raise InvalidRecord('comments — не список')
+    for comment in comments:
+        if not isinstance(comment, dict):
+            raise InvalidRecord('комментарий — не объект')
+        check_fields(comment, COMMENT_FIELDS)
+    return record
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортирует посты (и комментарии из NDJSON) пачками через '
+        'bulk_create. Поля: text, author, group, pub_date, image, '
+        'comments — список {author, text, created}.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл .ndjson/.jsonl/.csv или -')
+        parser.add_argument(
+            '--format', choices=('ndjson', 'csv'), default=None
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--transaction-size',
+            type=int,
+            default=20000,
+            help='Сколько записей фиксируется одной транзакцией.',
+        )
+        parser.add_argument(
+            '--create-authors',
+            action='store_true',
+            help='Создавать неизвестных авторов без пароля.',
+        )
+        parser.add_argument(
+            '--create-groups',
+            action='store_true',
+            help='Создавать неизвестные группы по slug.',
+        )
+
+    def handle(self, *args, path, batch_size, transaction_size, **options):
+        self.options = options
+        self.authors = {}
+        self.groups = {}
+        self.touched_authors = set()
+        self.touched_groups = set()
+        self.imported = self.comments = self.skipped = 0
+        fmt = options['format'] or (
+            'csv' if path.endswith('.csv') else 'ndjson'
+        )
+        started = time.monotonic()
+        with self.open(path) as source:
+            records = self.read(source, fmt)
+            for chunk in batches(records, transaction_size):
+                with transaction.atomic():
+                    for batch in batches(chunk, batch_size):
+                        self.import_batch(batch)
+                self.report(started)
+        self.finish()
+        self.report(started, final=True)
+
+    def open(self, path):
+        if path == '-':
+            return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+        try:
+            return open(path, encoding='utf-8', newline='')
+        except OSError as exc:
+            raise CommandError(f'Не удалось открыть {path}: {exc}')
+
+    def read(self, source, fmt):
+        for number, record in self.parse(source, fmt):
+            try:
+                yield number, validate(record)
+            except InvalidRecord as exc:
+                self.skip(number, exc)
+
+    def parse(self, source, fmt):
+        if fmt == 'csv':
+            for number, row in enumerate(csv.DictReader(source), start=2):
+                yield number, row
+            return
+        for number, line in enumerate(source, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield number, json.loads(line)
+            except ValueError as exc:
+                self.skip(number, f'не JSON: {exc}')
+
+    def skip(self, number, reason):
+        self.skipped += 1
+        if self.options['verbosity'] > 1:
+            self.stderr.write(f'Строка {number} пропущена: {reason}')
+
+    def resolve(self, batch):
+        """Дополняет карты username -> id и slug -> id одним запросом."""
+        names = set()
+        slugs = set()
+        for _, record in batch:
+            names.add(record.get('author'))
+            slugs.add(record.get('group') or None)
+            for comment in record.get('comments') or ():
+                names.add(comment.get('author'))
+        names = {name for name in names if name} - set(self.authors)
+        slugs = {slug for slug in slugs if slug} - set(self.groups)
+        if names:
+            self.authors.update(
+                User.objects.filter(username__in=names).values_list(
+                    'username', 'pk'
+                )
+            )
+            missing = names - set(self.authors)
+            if missing and self.options['create_authors']:
+                self.create_authors(missing)
+        if slugs:
+            self.groups.update(
+                Group.objects.filter(slug__in=slugs).values_list('slug', 'pk')
+            )
+            missing = slugs - set(self.groups)
+            if missing and self.options['create_groups']:
+                Group.objects.bulk_create(
+                    Group(title=slug, slug=slug, description='')
+                    for slug in missing
+                )
+                self.groups.update(
+                    Group.objects.filter(slug__in=missing).values_list(
+                        'slug', 'pk'
+                    )
+                )
+
+    def create_authors(self, names):
+        password = make_password(None)
+        User.objects.bulk_create(
+            User(username=name, password=password) for name in names
+        )
+        created = dict(
+            User.objects.filter(username__in=names).values_list(
+                'username', 'pk'
+            )
+        )
+        UserCounters.objects.bulk_create(
+            (UserCounters(user_id=pk) for pk in created.values()),
+            ignore_conflicts=True,
+        )
+        self.authors.update(created)
+
+    def build(self, record):
+        text = (record.get('text') or '').strip()
+        if not text:
+            raise InvalidRecord('пустой text')
+        author = self.authors.get(record.get('author'))
+        if author is None:
+            raise InvalidRecord(f'неизвестный автор {record.get("author")!r}')
+        slug = record.get('group') or None
+        group = self.groups.get(slug)
+        if slug and group is None:
+            raise InvalidRecord(f'неизвестная группа {slug!r}')
+        comments = []
+        for item in record.get('comments') or ():
+            comment_author = self.authors.get(item.get('author'))
+            if comment_author is None or not item.get('text'):
+                continue
+            comments.append(Comment(
+                author_id=comment_author,
+                text=item['text'],
+                created=parse_date(item.get('created')),
+            ))
+        pub_date = parse_date(record.get('pub_date'))
+        post = Post(
+            text=text,
+            author_id=author,
+            group_id=group,
+            pub_date=pub_date,
+            updated=pub_date,
+            image=record.get('image') or '',
+            comments_count=len(comments),
+        )
+        post.prepare_text()
+        return post, comments
+
+    def import_batch(self, batch):
+        self.resolve(batch)
+        posts = []
+        comments = []
+        for number, record in batch:
+            try:
+                post, post_comments = self.build(record)
+            except InvalidRecord as exc:
+                self.skip(number, exc)
+                continue
+            posts.append(post)
+            comments.append(post_comments)
+        if not posts:
+            return
+        fields = [
+            Post._meta.get_field('pub_date'),
+            Post._meta.get_field('updated'),
+            Comment._meta.get_field('created'),
+        ]
+        with manual_dates(*fields):
+            Post.objects.bulk_create(posts)
+            fill_pks(Post, posts)
+            for post, post_comments in zip(posts, comments):
+                for comment in post_comments:
+                    comment.post_id = post.pk
+            flat = [comment for group in comments for comment in group]
+            Comment.objects.bulk_create(flat)
+        # bulk_create не сохраняет файлы, ссылки на готовые берём сами.
+        for name, amount in Counter(
+            post.image.name for post in posts if is_hashed(post.image.name)
+        ).items():
+            retain(name, amount)
+        post_ids = [post.pk for post in posts]
+        search.index_posts(*post_ids)
+        search.index_post_comments(*post_ids)
+        for author_id, amount in Counter(
+            post.author_id for post in posts
+        ).items():
+            counters.bump_user(author_id, 'posts_count', amount)
+        for group_id, amount in Counter(
+            post.group_id for post in posts
+        ).items():
+            counters.bump_group(group_id, amount)
+        self.touched_authors.update(post.author_id for post in posts)
+        self.touched_groups.update(post.group_id for post in posts)
+        self.imported += len(posts)
+        self.comments += len(flat)
+
+    def finish(self):
+        """То, что делают сигналы: ленты подписчиков и версии кэша."""
+        follows = Follow.objects.filter(
+            author_id__in=self.touched_authors
+        ).values_list('user_id', 'author_id')
+        with transaction.atomic():
+            for user_id, author_id in follows.iterator():
+                timeline.backfill(user_id, author_id)
+        usernames = User.objects.filter(
+            pk__in=self.touched_authors
+        ).values_list('username', flat=True)
+        slugs = Group.objects.filter(
+            pk__in=self.touched_groups
+        ).values_list('slug', flat=True)
+        bump(
+            FEED,
+            *(author_scope(name) for name in usernames),
+            *(group_scope(slug) for slug in slugs),
+        )
+
+    def report(self, started, final=False):
+        elapsed = max(time.monotonic() - started, 1e-6)
+        line = (
+            f'Постов: {self.imported}, комментариев: {self.comments}, '
+            f'пропущено: {self.skipped}, '
+            f'{self.imported / elapsed:.0f} постов/с'
+        )
+        if final:
+            line = f'Готово за {elapsed:.1f} с. {line}'
+        self.stdout.write(line)
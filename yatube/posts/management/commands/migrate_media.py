@@ -0,0 +1,121 @@
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+from sorl.thumbnail import delete as delete_thumbnails
+
+from core.models import StoredFile
+from core.storage import HashedStorage, is_hashed, retain
+from core.versions import bump
+from posts.feed_cache import (
+    FEED, author_scope, group_scope, post_scope
+)
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов в HashedStorage. Сайт работает во '
+        'время переноса: файл сначала копируется, затем строка поста '
+        'переключается на новое имя, старый файл удаляется в самом конце.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--delete-old',
+            action='store_true',
+            help='Удалить старые файлы, на которые больше нет ссылок.',
+        )
+        parser.add_argument(
+            '--recount',
+            action='store_true',
+            help='Пересчитать ссылки на файлы по таблице постов.',
+        )
+
+    def handle(self, *args, batch_size, delete_old, recount, **options):
+        if not isinstance(default_storage, HashedStorage):
+            raise CommandError('DEFAULT_FILE_STORAGE — не HashedStorage.')
+        self.moved = {}
+        self.missing = set()
+        self.switched = 0
+        last = 0
+        while True:
+            rows = list(
+                Post.objects.filter(pk__gt=last).exclude(image='').order_by(
+                    'pk'
+                ).values_list(
+                    'pk', 'image', 'author__username', 'group__slug'
+                )[:batch_size]
+            )
+            if not rows:
+                break
+            last = rows[-1][0]
+            self.migrate_batch(rows)
+        self.stdout.write(
+            f'Постов переключено: {self.switched}, файлов перенесено: '
+            f'{len(self.moved)}, не найдено: {len(self.missing)}'
+        )
+        if delete_old:
+            self.delete_old()
+        if recount:
+            self.recount()
+
+    def move(self, old):
+        """Новое имя файла со взятой на него ссылкой или None."""
+        if old in self.moved:
+            retain(self.moved[old])
+        elif old in self.missing or not default_storage.exists(old):
+            self.missing.add(old)
+            return None
+        else:
+            with default_storage.open(old) as source:
+                self.moved[old] = default_storage.save(old, source)
+        return self.moved[old]
+
+    def migrate_batch(self, rows):
+        scopes = {FEED}
+        for pk, old, username, slug in rows:
+            if is_hashed(old):
+                continue
+            new = self.move(old)
+            if new is None:
+                self.stderr.write(f'Нет файла {old}')
+                continue
+            if not Post.objects.filter(pk=pk, image=old).update(image=new):
+                # Пост успели изменить, ссылка не понадобилась.
+                default_storage.delete(new)
+                continue
+            self.switched += 1
+            scopes.update((post_scope(pk), author_scope(username)))
+            if slug:
+                scopes.add(group_scope(slug))
+        bump(*scopes)
+
+    def delete_old(self):
+        plain = FileSystemStorage()
+        deleted = 0
+        for old in self.moved:
+            if Post.objects.filter(image=old).exists():
+                continue
+            delete_thumbnails(old, delete_file=False)
+            plain.delete(old)
+            deleted += 1
+        self.stdout.write(f'Старых файлов удалено: {deleted}')
+
+    def recount(self):
+        counts = dict(
+            Post.objects.exclude(image='').values_list('image').annotate(
+                refs=Count('pk')
+            )
+        )
+        # Одной транзакцией: delete() не должен увидеть промежуточный ноль.
+        with transaction.atomic():
+            StoredFile.objects.update(refs=0)
+            for name, refs in counts.items():
+                if is_hashed(name):
+                    StoredFile.objects.update_or_create(
+                        name=name, defaults={'refs': refs}
+                    )
+            orphans = StoredFile.objects.filter(refs=0).count()
+        self.stdout.write(f'Ссылки пересчитаны, файлов без ссылок: {orphans}')
@@ -0,0 +1,79 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts import timeline
+from posts.models import Comment, Follow, Group, Post, User, UserCounters
+
+
+def count_of(queryset, field):
+    """COUNT(*) связанных строк как подзапрос для annotate()."""
+    counts = queryset.filter(
+        **{field: OuterRef('pk')}
+    ).order_by().values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+COUNTERS = (
+    (Post, {'comments_count': (Comment.objects, 'post')}),
+    (Group, {'posts_count': (Post.objects, 'group')}),
+    (UserCounters, {
+        'posts_count': (Post.objects, 'author'),
+        'followers_count': (Follow.objects, 'author'),
+        'following_count': (Follow.objects, 'user'),
+    }),
+)
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики порциями.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, chunk_size, **options):
+        missing = User.objects.filter(
+            counters__isnull=True
+        ).values_list('pk', flat=True)
+        UserCounters.objects.bulk_create(
+            (UserCounters(user_id=pk) for pk in missing.iterator()),
+            batch_size=chunk_size,
+            ignore_conflicts=True,
+        )
+        for model, fields in COUNTERS:
+            fixed = self.recount(model, fields, chunk_size)
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: исправлено {fixed}'
+            )
+        promoted = timeline.promote()
+        self.stdout.write(f'Авторов с лентой на чтение: +{promoted}')
+
+    def recount(self, model, fields, chunk_size):
+        annotations = {
+            f'actual_{name}': count_of(queryset, field)
+            for name, (queryset, field) in fields.items()
+        }
+        last_pk = None
+        fixed = 0
+        while True:
+            chunk = model.objects.order_by('pk').only(*fields)
+            if last_pk is not None:
+                chunk = chunk.filter(pk__gt=last_pk)
+            chunk = list(chunk.annotate(**annotations)[:chunk_size])
+            if not chunk:
+                return fixed
+            changed = []
+            for obj in chunk:
+                stale = False
+                for name in fields:
+                    actual = getattr(obj, f'actual_{name}')
+                    if getattr(obj, name) != actual:
+                        setattr(obj, name, actual)
+                        stale = True
+                if stale:
+                    changed.append(obj)
+            with transaction.atomic():
+                model.objects.bulk_update(changed, fields)
+            fixed += len(changed)
+            last_pk = chunk[-1].pk
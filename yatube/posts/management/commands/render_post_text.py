@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет text_html и summary постов, сохранённых до их '
+        'появления или созданных в обход save().'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            dest='rebuild',
+            help='Пересчитать все посты, а не только пустые.',
+        )
+
+    def handle(self, *args, batch_size, rebuild, **options):
+        posts = Post.objects.order_by('pk').only('pk', 'text')
+        if not rebuild:
+            posts = posts.filter(text_html='')
+        last = 0
+        total = 0
+        while True:
+            batch = list(posts.filter(pk__gt=last)[:batch_size])
+            if not batch:
+                break
+            for post in batch:
+                post.prepare_text()
+            # bulk_update не трогает updated: ключи карточек не меняются.
+            Post.objects.bulk_update(batch, ('text_html', 'summary'))
+            last = batch[-1].pk
+            total += len(batch)
+            self.stdout.write(f'Обработано: {total}')
+        self.stdout.write(f'Готово, постов: {total}')
@@ -0,0 +1,198 @@
+import random
+from datetime import timedelta
+from io import BytesIO
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image
+
+from core.versions import bump
+from posts import search, timeline
+from posts.bulk import manual_dates
+from posts.feed_cache import FEED
+from posts.models import Comment, Follow, Group, Post, User
+
+WORDS = (
+    'утро вечер город море горы лес поезд кофе книга музыка дождь '
+    'солнце друзья работа отпуск кино фото прогулка улица мост'
+).split()
+
+
+def new_pks(model, after):
+    return list(
+        model.objects.filter(pk__gt=after or 0).values_list('pk', flat=True)
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет базу синтетическими данными через bulk_create '
+        'для нагрузочных замеров.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=50000)
+        parser.add_argument('--follows', type=int, default=20000)
+        parser.add_argument('--images', type=int, default=100)
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.since = timezone.now() - timedelta(days=options['days'])
+        self.span = options['days'] * 24 * 3600
+
+        users = self.seed_users(options['users'])
+        groups = self.seed_groups(options['groups'])
+        # Немногие авторы пишут большую часть постов, как в жизни.
+        weights = list(accumulate(
+            1 / rank for rank in range(1, len(users) + 1)
+        ))
+        images = self.seed_images(options['images'])
+        posts = self.seed_posts(
+            options['posts'], users, weights, groups, images
+        )
+        self.seed_comments(options['comments'], users, posts)
+        follows = self.seed_follows(options['follows'], users, weights)
+
+        call_command('recount_counters', stdout=self.stdout)
+        with transaction.atomic():
+            for user_id, author_id in follows:
+                timeline.backfill(user_id, author_id)
+        total = search.rebuild(self.batch_size)
+        bump(FEED)
+        self.stdout.write(
+            f'Пользователей: {len(users)}, групп: {len(groups)}, '
+            f'постов: {len(posts)}, подписок: {len(follows)}, '
+            f'в поисковом индексе: {total}'
+        )
+
+    def moment(self):
+        return self.since + timedelta(
+            seconds=self.random.randrange(self.span)
+        )
+
+    def text(self, words):
+        return ' '.join(self.random.choices(WORDS, k=words)).capitalize()
+
+    def insert(self, model, objects, **options):
+        """bulk_create порциями: в памяти не больше batch_size объектов.
+
+        Размер одного INSERT Django подбирает сам под лимиты базы.
+        """
+        objects = iter(objects)
+        while True:
+            chunk = list(islice(objects, self.batch_size))
+            if not chunk:
+                return
+            model.objects.bulk_create(chunk, **options)
+
+    def create(self, model, objects):
+        before = model.objects.aggregate(last=Max('pk'))['last']
+        self.insert(model, objects)
+        return new_pks(model, before)
+
+    def seed_users(self, amount):
+        start = User.objects.aggregate(last=Max('pk'))['last'] or 0
+        password = make_password('password')
+        return self.create(User, (
+            User(
+                username=f'seed{start + i}',
+                first_name='Имя',
+                last_name=f'Фамилия{i}',
+                password=password,
+            )
+            for i in range(amount)
+        ))
+
+    def seed_groups(self, amount):
+        start = Group.objects.aggregate(last=Max('pk'))['last'] or 0
+        return self.create(Group, (
+            Group(
+                title=f'Группа {start + i}',
+                slug=f'seed-{start + i}',
+                description=self.text(10),
+            )
+            for i in range(amount)
+        ))
+
+    def seed_images(self, amount):
+        names = []
+        for i in range(amount):
+            color = tuple(self.random.randrange(256) for _ in range(3))
+            buffer = BytesIO()
+            Image.new('RGB', (1200, 800), color).save(buffer, 'JPEG')
+            names.append(default_storage.save(
+                f'posts/seed_{i}.jpg', ContentFile(buffer.getvalue())
+            ))
+        return names
+
+    def seed_posts(self, amount, users, weights, groups, images):
+        with_image = dict(zip(
+            self.random.sample(range(amount), min(len(images), amount)),
+            images,
+        ))
+        fields = (
+            Post._meta.get_field('pub_date'), Post._meta.get_field('updated')
+        )
+        with manual_dates(*fields):
+            return self.create(Post, (
+                self.post(users, weights, groups, with_image.get(i, ''))
+                for i in range(amount)
+            ))
+
+    def post(self, users, weights, groups, image):
+        moment = self.moment()
+        group = self.random.choice(groups) if groups else None
+        post = Post(
+            author_id=self.random.choices(users, cum_weights=weights)[0],
+            group_id=group if self.random.random() < 0.7 else None,
+            text=self.text(self.random.randint(5, 60)),
+            pub_date=moment,
+            updated=moment,
+            image=image,
+        )
+        post.prepare_text()
+        return post
+
+    def seed_comments(self, amount, users, posts):
+        if not posts:
+            return
+        with manual_dates(Comment._meta.get_field('created')):
+            self.insert(Comment, (
+                Comment(
+                    post_id=self.random.choice(posts),
+                    author_id=self.random.choice(users),
+                    text=self.text(self.random.randint(3, 20)),
+                    created=self.moment(),
+                )
+                for _ in range(amount)
+            ))
+
+    def seed_follows(self, amount, users, weights):
+        pairs = set()
+        attempts = amount * 3
+        while len(pairs) < amount and attempts and len(users) > 1:
+            attempts -= 1
+            user = self.random.choice(users)
+            author = self.random.choices(users, cum_weights=weights)[0]
+            if user != author:
+                pairs.add((user, author))
+        self.insert(
+            Follow,
+            (Follow(user_id=user, author_id=author) for user, author in pairs),
+            ignore_conflicts=True,
+        )
+        return pairs
@@ -1,9 +1,13 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
+from django.utils.html import linebreaks
+from django.utils.text import Truncator
 from pytils.translit import slugify
 
 User = get_user_model()
 
+SUMMARY_WORDS = 30
+
 
 class Post(models.Model):
     text = models.TextField(max_length=200, verbose_name='Текст')
@@ -12,6 +16,11 @@ class Post(models.Model):
         verbose_name='Дата',
         db_index=True
     )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Изменён',
+        db_index=True
+    )
     author = models.ForeignKey(
         User, on_delete=models.CASCADE,
         related_name='posts',
@@ -30,15 +39,65 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        'Комментариев',
+        default=0,
+        editable=False,
+    )
+    # Готовый HTML текста и краткое содержание: шаблоны не повторяют
+    # linebreaks и truncatewords при каждом показе.
+    text_html = models.TextField(blank=True, editable=False)
+    summary = models.TextField(blank=True, editable=False)
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = (
+            models.Index(
+                fields=('author', 'updated'),
+                name='post_author_updated_idx',
+            ),
+            models.Index(
+                fields=('group', 'updated'),
+                name='post_group_updated_idx',
+            ),
+        )
 
     def __str__(self):
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        self.prepare_text()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'text' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'text_html', 'summary'}
+        # Ссылка на файл картинки, строка поста и счётчики из сигналов
+        # фиксируются вместе.
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields,
+                   forced_update):
+        if update_fields is None:
+            # comments_count меняется только через F(): полное сохранение
+            # записало бы значение, прочитанное вместе с объектом.
+            # Вставка новой строки пишет его как обычно.
+            values = [
+                value for value in values
+                if value[0].name != 'comments_count'
+            ]
+        return super()._do_update(
+            base_qs, using, pk_val, values, update_fields, forced_update
+        )
+
+    def prepare_text(self):
+        """То же, что фильтры linebreaks и truncatewords:30."""
+        self.text_html = linebreaks(self.text, autoescape=True)
+        self.summary = Truncator(self.text).words(
+            SUMMARY_WORDS, truncate=' …'
+        )
+
 
 class Group(models.Model):
     title = models.CharField(
@@ -53,6 +112,11 @@ class Group(models.Model):
     description = models.TextField(
         'Текст'
     )
+    posts_count = models.PositiveIntegerField(
+        'Постов',
+        default=0,
+        editable=False,
+    )
 
     def __str__(self):
         return self.title
@@ -74,12 +138,18 @@ class Comment(models.Model):
         on_delete=models.CASCADE
     )
     text = models.TextField(verbose_name='Комментарий')
-    created = models.DateTimeField(auto_now_add=True)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
 
     class Meta:
         ordering = ('-created',)
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = (
+            models.Index(
+                fields=('post', '-created', '-id'),
+                name='comment_post_created_idx',
+            ),
+        )
 
     def __str__(self):
         return self.text[:15]
@@ -100,3 +170,72 @@ class Follow(models.Model):
         blank=False,
         null=False,
     )
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'author'),
+                name='unique_follow',
+            ),
+        )
+
+
+class UserCounters(models.Model):
+    """Счётчики пользователя, поддерживаемые сигналами."""
+    user = models.OneToOneField(
+        User,
+        related_name='counters',
+        on_delete=models.CASCADE,
+        primary_key=True,
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+    # Ставится, когда подписчиков становится TIMELINE_FANOUT_LIMIT, и при
+    # отписках не снимается: новых постов автора в лентах уже нет.
+    fanout_on_read = models.BooleanField(
+        'Лента подписчиков читается напрямую', default=False
+    )
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+
+class TimelineEntry(models.Model):
+    """Пост в материализованной ленте подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        related_name='timeline',
+        on_delete=models.CASCADE,
+    )
+    post = models.ForeignKey(
+        Post,
+        related_name='timeline_entries',
+        on_delete=models.CASCADE,
+    )
+    author = models.ForeignKey(
+        User,
+        related_name='+',
+        on_delete=models.CASCADE,
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ('-pub_date',)
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='unique_timeline_post',
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date'),
+                name='timeline_user_date_idx',
+            ),
+            models.Index(
+                fields=('user', 'author'),
+                name='timeline_user_author_idx',
+            ),
+        )
@@ -0,0 +1,188 @@
+import base64
+import binascii
+import calendar
+from collections.abc import Sequence
+from datetime import datetime
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils import timezone
+
+MICROSECONDS = 10 ** 6
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(moment, pk):
+    """Упаковывает ключ (дата, id) в непрозрачный токен для URL."""
+    if timezone.is_aware(moment):
+        moment = timezone.make_naive(moment, timezone.utc)
+    micros = (
+        calendar.timegm(moment.timetuple()) * MICROSECONDS
+        + moment.microsecond
+    )
+    raw = f'{micros}.{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    padding = '=' * (-len(token) % 4)
+    try:
+        raw = base64.urlsafe_b64decode(token + padding).decode()
+        micros, pk = (int(part) for part in raw.split('.'))
+        moment = datetime.utcfromtimestamp(micros // MICROSECONDS).replace(
+            microsecond=micros % MICROSECONDS
+        )
+    except (binascii.Error, UnicodeDecodeError, ValueError,
+            OverflowError, OSError):
+        raise InvalidCursor(token)
+    if settings.USE_TZ:
+        moment = timezone.make_aware(moment, timezone.utc)
+    return moment, pk
+
+
+class CursorPage(Sequence):
+    """Страница ленты без номера: соседние страницы задаются курсорами."""
+
+    paginator = None
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Keyset-пагинация по (date_field, id) без COUNT(*) и OFFSET.
+
+    Стоимость любой страницы одинакова: выборка идёт по индексу
+    date_field начиная с ключа из курсора.
+    """
+
+    def __init__(self, queryset, per_page, date_field='pub_date'):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.date_field = date_field
+
+    def _seek(self, cursor, newer):
+        moment, pk = decode_cursor(cursor)
+        lookup = 'gt' if newer else 'lt'
+        return self.queryset.filter(
+            Q(**{f'{self.date_field}__{lookup}': moment})
+            | Q(**{self.date_field: moment, f'pk__{lookup}': pk})
+        )
+
+    def _cursor(self, obj):
+        return encode_cursor(getattr(obj, self.date_field), obj.pk)
+
+    def page(self, after=None, before=None):
+        descending = (f'-{self.date_field}', '-pk')
+        if before:
+            queryset = self._seek(before, newer=True).order_by(
+                self.date_field, 'pk'
+            )
+        elif after:
+            queryset = self._seek(after, newer=False).order_by(*descending)
+        else:
+            queryset = self.queryset.order_by(*descending)
+        rows = list(queryset[:self.per_page + 1])
+        if before and not rows:
+            return self.page()
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if before:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, bool(after and rows)
+        return CursorPage(
+            rows,
+            next_cursor=self._cursor(rows[-1]) if has_next else None,
+            previous_cursor=self._cursor(rows[0]) if has_previous else None,
+        )
+
+
+def paginate(request, queryset, per_page=None, date_field='pub_date'):
+    """Страница ленты для запроса.
+
+    Курсорный режим включается параметрами ?after=/?before= или
+    настройкой CURSOR_PAGINATION; иначе — обычный Paginator по ?page=.
+    Испорченный курсор отдаёт первую страницу.
+    """
+    per_page = per_page or settings.AMOUNT_POSTS
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    if after or before or settings.CURSOR_PAGINATION:
+        paginator = CursorPaginator(queryset, per_page, date_field)
+        try:
+            return paginator.page(after=after, before=before)
+        except InvalidCursor:
+            return paginator.page()
+    paginator = Paginator(queryset, per_page)
+    return paginator.get_page(request.GET.get('page'))
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator для админки без точного COUNT(*) по большим таблицам.
+
+    Для таблицы целиком число строк берётся из статистики ANALYZE
+    (sqlite_stat1) или по максимальному id. Выборка с фильтром
+    считается точно до ESTIMATED_COUNT_LIMIT строк; дальше её оценка —
+    вся таблица, чтобы последние страницы оставались доступны.
+    Маленькие таблицы всегда считаются точно.
+    """
+
+    @cached_property
+    def count(self):
+        limit = settings.ESTIMATED_COUNT_LIMIT
+        queryset = self.object_list
+        if queryset.query.where:
+            counted = queryset.order_by()[:limit].count()
+            if counted < limit:
+                return counted
+        estimate = self.estimate(queryset)
+        if estimate is None or estimate < limit:
+            return queryset.count()
+        return estimate
+
+    def estimate(self, queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != 'sqlite':
+            return None
+        table = queryset.model._meta.db_table
+        pk = queryset.model._meta.pk.column
+        with connection.cursor() as cursor:
+            row = None
+            if 'sqlite_stat1' in connection.introspection.table_names(cursor):
+                cursor.execute(
+                    'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+                    [table],
+                )
+                row = cursor.fetchone()
+            if row:
+                return int(row[0].split()[0])
+            cursor.execute(f'SELECT MAX("{pk}") FROM "{table}"')
+            return cursor.fetchone()[0]
@@ -0,0 +1,194 @@
+import base64
+import binascii
+import re
+
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+
+from .paginators import CursorPage, InvalidCursor
+
+TABLE = 'posts_search'
+COMMENTS_TABLE = 'posts_comment_search'
+# Текст поста весит вдвое больше комментария; чем меньше bm25, тем лучше.
+POST_WEIGHT = 2.0
+WORD = re.compile(r'\w+')
+
+INDEX_POSTS_SQL = f'''
+    INSERT INTO {TABLE} (rowid, text)
+    SELECT post.id, post.text FROM posts_post AS post
+'''
+# Комментарий — отдельная строка индекса: новый не пересобирает
+# строку поста со всеми остальными.
+INDEX_COMMENTS_SQL = f'''
+    INSERT INTO {COMMENTS_TABLE} (rowid, text, post_id)
+    SELECT comment.id, comment.text, comment.post_id
+    FROM posts_comment AS comment
+'''
+# Ранг поста — лучший из рангов его текста и комментариев.
+RANKED_SQL = f'''
+    SELECT post_id, MIN(score) AS score FROM (
+        SELECT rowid AS post_id, bm25({TABLE}) * {POST_WEIGHT} AS score
+        FROM {TABLE} WHERE {TABLE} MATCH %s
+        UNION ALL
+        SELECT post_id, bm25({COMMENTS_TABLE}) AS score
+        FROM {COMMENTS_TABLE} WHERE {COMMENTS_TABLE} MATCH %s
+    ) GROUP BY post_id
+'''
+
+
+def enabled():
+    """Индекс создаётся миграциями только на SQLite."""
+    return connection.vendor == 'sqlite'
+
+
+def match_expression(query):
+    """Строка запроса в синтаксисе FTS5: все слова, по префиксу.
+
+    Спецсимволы FTS5 из пользовательского ввода отбрасываются,
+    поэтому запрос не может сломаться с синтаксической ошибкой.
+    """
+    words = WORD.findall(query.lower())
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def reindex(table, insert_sql, rowids, where, params):
+    if not params or not enabled():
+        return
+    marks = ', '.join(['%s'] * len(params))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE rowid IN ({rowids.format(marks)})',
+            params,
+        )
+        cursor.execute(f'{insert_sql} WHERE {where} IN ({marks})', params)
+
+
+def index_posts(*post_ids):
+    """Пересобирает строки индекса с текстом постов."""
+    reindex(TABLE, INDEX_POSTS_SQL, '{}', 'post.id', post_ids)
+
+
+def index_comments(*comment_ids):
+    """Пересобирает строки индекса отдельных комментариев."""
+    reindex(
+        COMMENTS_TABLE, INDEX_COMMENTS_SQL, '{}', 'comment.id', comment_ids
+    )
+
+
+def index_post_comments(*post_ids):
+    """Индексирует все комментарии постов, например после bulk_create."""
+    reindex(
+        COMMENTS_TABLE,
+        INDEX_COMMENTS_SQL,
+        'SELECT id FROM posts_comment WHERE post_id IN ({})',
+        'comment.post_id',
+        post_ids,
+    )
+
+
+def unindex(table, rowid):
+    if enabled():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {table} WHERE rowid = %s', [rowid])
+
+
+def unindex_post(post_id):
+    unindex(TABLE, post_id)
+
+
+def unindex_comment(comment_id):
+    unindex(COMMENTS_TABLE, comment_id)
+
+
+def rebuild(batch_size=1000):
+    """Заново индексирует посты и комментарии; возвращает число постов.
+
+    Каждая порция по id фиксируется своей транзакцией, поэтому запись
+    на сайте не ждёт конца перестройки.
+    """
+    if not enabled():
+        return 0
+    counts = []
+    for table, insert_sql, column in (
+        (TABLE, INDEX_POSTS_SQL, 'post.id'),
+        (COMMENTS_TABLE, INDEX_COMMENTS_SQL, 'comment.id'),
+    ):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {table}')
+        last_id = 0
+        total = 0
+        while True:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    f'{insert_sql} WHERE {column} > %s '
+                    f'ORDER BY {column} LIMIT %s',
+                    [last_id, batch_size],
+                )
+                if cursor.rowcount <= 0:
+                    break
+                total += cursor.rowcount
+                cursor.execute(f'SELECT MAX(rowid) FROM {table}')
+                last_id = cursor.fetchone()[0]
+        counts.append(total)
+    return counts[0]
+
+
+def matching(queryset, query):
+    """Фильтр queryset постов по индексу, без ранжирования."""
+    match = match_expression(query)
+    if not match:
+        return queryset.none()
+    return queryset.filter(pk__in=RawSQL(
+        f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s '
+        f'UNION SELECT post_id FROM {COMMENTS_TABLE} '
+        f'WHERE {COMMENTS_TABLE} MATCH %s',
+        [match, match],
+    ))
+
+
+def encode_cursor(score, pk):
+    raw = f'{score!r}:{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    padding = '=' * (-len(token) % 4)
+    try:
+        raw = base64.urlsafe_b64decode(token + padding).decode()
+        score, pk = raw.split(':')
+        return float(score), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor(token)
+
+
+def search(queryset, query, per_page, after=None):
+    """Страница найденных постов по убыванию релевантности.
+
+    Пагинация keyset по паре (ранг bm25, id): следующая страница
+    начинается сразу за последней строкой предыдущей.
+    """
+    match = match_expression(query)
+    if not match:
+        return CursorPage([])
+    sql = f'SELECT post_id, score FROM ({RANKED_SQL})'
+    params = [match, match]
+    if after:
+        score, pk = decode_cursor(after)
+        sql += ' WHERE score > %s OR (score = %s AND post_id > %s)'
+        params += [score, score, pk]
+    sql += ' ORDER BY score, post_id LIMIT %s'
+    params.append(per_page + 1)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    posts = queryset.in_bulk([pk for pk, _ in rows])
+    next_cursor = None
+    if has_next:
+        pk, score = rows[-1]
+        next_cursor = encode_cursor(score, pk)
+    return CursorPage(
+        [posts[pk] for pk, _ in rows if pk in posts],
+        next_cursor=next_cursor,
+    )
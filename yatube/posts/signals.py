@@ -0,0 +1,183 @@
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.storage import HashedStorage
+from core.versions import bump
+
+from . import counters, feed_cache, followees, search, timeline
+from .models import Comment, Follow, Group, Post, User, UserCounters
+
+
+# Поля автора, которые видны в карточке поста.
+AUTHOR_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+def author_names(user):
+    return {field: getattr(user, field) for field in AUTHOR_FIELDS}
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Полное сохранение (например, смена пароля) имён обычно не меняет,
+    # поэтому прежние имена сравниваются с новыми.
+    instance._previous_names = None
+    if raw or instance._state.adding:
+        return
+    if update_fields is None or AUTHOR_FIELDS & set(update_fields):
+        instance._previous_names = User.objects.filter(
+            pk=instance.pk
+        ).values(*AUTHOR_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_names', None)
+    if created:
+        UserCounters.objects.get_or_create(user=instance)
+    elif previous is not None and previous != author_names(instance):
+        # Карточки сменят ключ сами, а готовые фрагменты лент — нет.
+        slugs = Group.objects.filter(posts__author=instance).values_list(
+            'slug', flat=True
+        ).distinct()
+        usernames = {previous['username'], instance.username}
+        # Имена видны на страницах постов и комментариев: их updated —
+        # это Last-Modified и ETag страницы поста.
+        Post.objects.filter(
+            Q(author=instance) | Q(comments__author=instance)
+        ).update(updated=timezone.now())
+        bump(
+            feed_cache.FEED,
+            *(feed_cache.author_scope(name) for name in usernames),
+            *(feed_cache.group_scope(slug) for slug in slugs),
+        )
+
+
+def release_image(name):
+    # Без счётчика ссылок файл может быть нужен другим постам.
+    storage = Post._meta.get_field('image').storage
+    if name and isinstance(storage, HashedStorage):
+        transaction.on_commit(lambda: storage.delete(name))
+
+
+def image_name(post):
+    # Без обращения к полю: отложенное only() поле не догружается.
+    image = post.__dict__.get('image')
+    return getattr(image, 'name', image)
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Прежние группа и картинка читаются только при их сохранении,
+    # а не при каждой загрузке объекта; slug группы — тем же запросом.
+    instance._previous = {}
+    if raw or instance._state.adding:
+        return
+    fields = {'group', 'image'}
+    if update_fields is not None:
+        fields &= set(update_fields)
+    if 'group' in fields:
+        fields.add('group__slug')
+    if fields:
+        instance._previous = Post.objects.filter(pk=instance.pk).values(
+            *fields
+        ).first() or {}
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous', {})
+    group_id = previous.get('group', instance.group_id)
+    if created:
+        counters.bump_user(instance.author_id, 'posts_count', 1)
+        counters.bump_group(instance.group_id, 1)
+        timeline.fan_out(instance)
+    elif instance.group_id != group_id:
+        counters.bump_group(group_id, -1)
+        counters.bump_group(instance.group_id, 1)
+    if 'image' in previous and previous['image'] != image_name(instance):
+        release_image(previous['image'])
+    search.index_posts(instance.pk)
+    bump(*feed_cache.post_scopes(instance, previous.get('group__slug')))
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, 'posts_count', -1)
+    counters.bump_group(instance.group_id, -1)
+    search.unindex_post(instance.pk)
+    release_image(image_name(instance))
+    bump(*feed_cache.post_scopes(instance))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.bump_post(instance.post_id, 1)
+    search.index_comments(instance.pk)
+    bump(*feed_cache.post_scopes(instance.post))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.bump_post(instance.post_id, -1)
+    search.unindex_comment(instance.pk)
+    post = Post.objects.select_related('author', 'group').filter(
+        pk=instance.post_id
+    ).first()
+    if post is not None:
+        bump(*feed_cache.post_scopes(post))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    if not kwargs.get('raw'):
+        bump(feed_cache.FEED, feed_cache.group_scope(instance.slug))
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def group_touched(sender, instance, raw=False, created=False, **kwargs):
+    # Страница поста показывает группу; после удаления группы поле
+    # обнулит UPDATE без сигналов, поэтому посты отмечаются заранее.
+    if not raw and not created:
+        instance.posts.update(updated=timezone.now())
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump_user(instance.author_id, 'followers_count', 1)
+        counters.bump_user(instance.user_id, 'following_count', 1)
+        timeline.promote(instance.author_id)
+        timeline.backfill(instance.user_id, instance.author_id)
+        followees.invalidate(instance.user_id)
+        bump(
+            feed_cache.follow_scope(instance.user_id),
+            feed_cache.author_scope(instance.author.username),
+            feed_cache.author_scope(instance.user.username),
+        )
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, 'followers_count', -1)
+    counters.bump_user(instance.user_id, 'following_count', -1)
+    timeline.trim(instance.user_id, instance.author_id)
+    followees.invalidate(instance.user_id)
+    bump(
+        feed_cache.follow_scope(instance.user_id),
+        feed_cache.author_scope(instance.author.username),
+        feed_cache.author_scope(instance.user.username),
+    )
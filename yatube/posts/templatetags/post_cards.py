@@ -0,0 +1,15 @@
+from django import template
+
+from ..cards import render_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_cards(posts):
+    return render_cards(posts)
+
+
+@register.simple_tag
+def post_card(cards, post):
+    return cards[post.pk]
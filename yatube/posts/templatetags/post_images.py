@@ -0,0 +1,13 @@
+from django import template
+from django.conf import settings
+
+from ..thumbnails import variants
+
+register = template.Library()
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def post_image(post):
+    if not post.image:
+        return {}
+    return {'sizes': settings.POST_IMAGE_SIZES, **variants(post.image)}
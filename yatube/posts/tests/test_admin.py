@@ -0,0 +1,70 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Max
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Group, Post
+from ..paginators import EstimatedCountPaginator
+
+User = get_user_model()
+
+
+class AdminChangelistTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_posts(self, amount):
+        for _ in range(amount):
+            post = Post.objects.create(
+                author=self.admin, text='Текст', group=self.group
+            )
+            Comment.objects.create(
+                post=post, author=self.admin, text='Комментарий'
+            )
+
+    def changelist_queries(self, name):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse(f'admin:posts_{name}_changelist')
+            )
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_queries_do_not_grow_with_rows(self):
+        for name in ('post', 'comment'):
+            with self.subTest(name=name):
+                self.add_posts(2)
+                few = self.changelist_queries(name)
+                self.add_posts(4)
+                self.assertEqual(self.changelist_queries(name), few)
+
+    @override_settings(ESTIMATED_COUNT_LIMIT=3)
+    def test_large_tables_are_estimated(self):
+        self.add_posts(5)
+        Post.objects.order_by('pk').first().delete()
+        last_pk = Post.objects.aggregate(Max('pk'))['pk__max']
+        paginator = EstimatedCountPaginator(Post.objects.all(), 2)
+        self.assertEqual(paginator.count, last_pk)
+        filtered = Post.objects.filter(group=self.group)
+        paginator = EstimatedCountPaginator(filtered, 2)
+        self.assertEqual(paginator.count, last_pk)
+        shown = [
+            post
+            for number in paginator.page_range
+            for post in paginator.page(number)
+        ]
+        self.assertEqual(len(shown), filtered.count())
+        paginator = EstimatedCountPaginator(filtered.filter(pk__lt=3), 2)
+        self.assertEqual(paginator.count, 1)
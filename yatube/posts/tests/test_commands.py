@@ -0,0 +1,270 @@
+import json
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core.models import StoredFile
+from core.storage import is_hashed
+
+from ..management.commands.benchmark import percentile
+from ..models import Comment, Follow, Group, Post, TimelineEntry, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class SeedAndBenchmarkTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_seed_then_benchmark(self):
+        call_command(
+            'seed_data',
+            users=10,
+            groups=2,
+            posts=40,
+            comments=30,
+            follows=15,
+            images=2,
+            seed=1,
+            stdout=StringIO(),
+        )
+        self.assertEqual(User.objects.count(), 10)
+        self.assertEqual(Group.objects.count(), 2)
+        self.assertEqual(Post.objects.exclude(image='').count(), 2)
+        self.assertEqual(Comment.objects.count(), 30)
+        self.assertEqual(Follow.objects.count(), 15)
+        self.assertTrue(TimelineEntry.objects.exists())
+        self.assertEqual(
+            sum(Post.objects.values_list('comments_count', flat=True)), 30
+        )
+
+        out = StringIO()
+        call_command('benchmark', repeat=3, warmup=0, stdout=out)
+        results = json.loads(out.getvalue())['results']
+        self.assertIn('follow_index', results)
+        self.assertNotIn('profile_follow', results)
+        for name, result in results.items():
+            with self.subTest(name=name):
+                self.assertEqual(result['status'], 200)
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+                self.assertGreater(result['queries'], 0)
+
+
+class PercentileTest(SimpleTestCase):
+    def test_nearest_rank(self):
+        cases = (
+            (50, 0.50, 24),
+            (100, 0.95, 94),
+            (100, 0.07, 6),
+            (1, 0.99, 0),
+            (3, 0.50, 1),
+        )
+        for size, share, index in cases:
+            with self.subTest(size=size, share=share):
+                self.assertEqual(percentile(range(size), share), index)
+
+
+class ImportPostsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def import_file(self, suffix, content, **options):
+        with tempfile.NamedTemporaryFile(
+            'w', suffix=suffix, encoding='utf-8'
+        ) as source:
+            source.write(content)
+            source.flush()
+            out = StringIO()
+            call_command(
+                'import_posts', source.name, stdout=out, **options
+            )
+        return out.getvalue()
+
+    def test_ndjson_with_comments(self):
+        records = [
+            {
+                'text': 'Первый',
+                'author': 'author',
+                'group': 'group',
+                'pub_date': '2020-01-02T10:00:00',
+                'comments': [
+                    {'author': 'reader', 'text': 'Ответ'},
+                    {'author': 'new', 'text': 'Автора создадим'},
+                ],
+            },
+            {'text': 'Второй', 'author': 'new', 'group': 'fresh'},
+            {'text': '', 'author': 'author'},
+            {'text': 'Чужой', 'author': 'ghost', 'group': 'group'},
+        ]
+        lines = '\n'.join(json.dumps(record) for record in records)
+        output = self.import_file(
+            '.ndjson', lines + '\nне json\n',
+            batch_size=2, transaction_size=3,
+            create_authors=True, create_groups=True,
+        )
+        self.assertIn('Готово', output)
+        self.assertIn('Постов: 3', output)
+        self.assertIn('пропущено: 2', output)
+        first = Post.objects.get(text='Первый')
+        self.assertEqual(first.pub_date.year, 2020)
+        self.assertEqual(first.comments_count, 2)
+        self.assertEqual(
+            sorted(first.comments.values_list('text', flat=True)),
+            ['Автора создадим', 'Ответ'],
+        )
+        self.assertTrue(Group.objects.filter(slug='fresh').exists())
+        new = User.objects.get(username='ghost')
+        self.assertFalse(new.has_usable_password())
+        self.assertEqual(new.counters.posts_count, 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 2)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader, post=first).exists()
+        )
+
+    def test_ndjson_skips_malformed_records(self):
+        lines = [
+            '[1, 2]',
+            '"строка"',
+            json.dumps({'text': 'Текст', 'author': ['author']}),
+            json.dumps({'text': 'Текст', 'author': 'author',
+                        'comments': 'не список'}),
+            json.dumps({'text': 'Текст', 'author': 'author',
+                        'comments': ['не объект']}),
+            json.dumps({'text': 'Текст', 'author': 'author',
+                        'pub_date': '2020-13-45T10:00:00'}),
+            json.dumps({'text': 'Целый', 'author': 'author'}),
+        ]
+        output = self.import_file('.ndjson', '\n'.join(lines), batch_size=2)
+        self.assertIn('Постов: 1', output)
+        self.assertIn('пропущено: 6', output)
+        self.assertTrue(Post.objects.filter(text='Целый').exists())
+
+    def test_csv_skips_rows_with_comments(self):
+        output = self.import_file(
+            '.csv',
+            'text,author,comments\n'
+            'Без комментариев,author,\n'
+            'С комментариями,author,ответ\n',
+        )
+        self.assertIn('Постов: 1', output)
+        self.assertIn('пропущено: 1', output)
+        self.assertTrue(Post.objects.filter(text='Без комментариев').exists())
+
+    def test_csv_skips_unknown_authors(self):
+        output = self.import_file(
+            '.csv',
+            'text,author,group\n'
+            'Из CSV,author,group\n'
+            'Без автора,nobody,\n',
+        )
+        self.assertIn('Постов: 1', output)
+        self.assertIn('пропущено: 1', output)
+        post = Post.objects.get(text='Из CSV')
+        self.assertEqual(post.group, self.group)
+        self.assertFalse(User.objects.filter(username='nobody').exists())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MigrateMediaTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def legacy_file(self, name, content):
+        plain = FileSystemStorage()
+        plain.save(name, ContentFile(content))
+        return plain
+
+    def test_moves_files_and_deduplicates(self):
+        plain = self.legacy_file('posts/one.jpg', b'picture')
+        self.legacy_file('posts/two.jpg', b'picture')
+        posts = [
+            Post.objects.create(author=self.author, text='Текст', image=name)
+            for name in ('posts/one.jpg', 'posts/one.jpg', 'posts/two.jpg')
+        ]
+        Post.objects.create(
+            author=self.author, text='Текст', image='posts/lost.jpg'
+        )
+        out = StringIO()
+        call_command(
+            'migrate_media', batch_size=2, delete_old=True,
+            stdout=out, stderr=StringIO(),
+        )
+        self.assertIn('Постов переключено: 3', out.getvalue())
+        self.assertIn('не найдено: 1', out.getvalue())
+        names = {
+            Post.objects.get(pk=post.pk).image.name for post in posts
+        }
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertTrue(is_hashed(name))
+        self.assertEqual(StoredFile.objects.get(name=name).refs, 3)
+        self.assertFalse(plain.exists('posts/one.jpg'))
+        self.assertTrue(plain.exists(name))
+
+        immediately = mock.patch(
+            'posts.signals.transaction.on_commit', lambda func: func()
+        )
+        first, second, third = Post.objects.filter(
+            pk__in=[post.pk for post in posts]
+        )
+        with immediately:
+            first.delete()
+            second.delete()
+            self.assertTrue(plain.exists(name))
+            third.delete()
+        self.assertFalse(plain.exists(name))
+
+    def test_import_retains_existing_files(self):
+        name = default_storage.save('posts/a.jpg', ContentFile(b'picture'))
+        Post.objects.create(author=self.author, text='Текст', image=name)
+        with tempfile.NamedTemporaryFile(
+            'w', suffix='.ndjson', encoding='utf-8'
+        ) as source:
+            source.write(json.dumps(
+                {'text': 'Копия', 'author': 'author', 'image': name}
+            ))
+            source.flush()
+            call_command('import_posts', source.name, stdout=StringIO())
+        self.assertEqual(StoredFile.objects.get(name=name).refs, 2)
+
+    def test_failed_post_save_releases_reference(self):
+        post = Post(
+            author=self.author,
+            text='Текст',
+            image=ContentFile(b'failed', name='a.jpg'),
+        )
+        with mock.patch(
+            'posts.signals.search.index_posts', side_effect=RuntimeError
+        ):
+            with self.assertRaises(RuntimeError):
+                post.save()
+        self.assertFalse(StoredFile.objects.filter(refs__gt=0).exists())
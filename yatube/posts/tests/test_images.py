@@ -0,0 +1,274 @@
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core.kvstore import KVStore
+from ..forms import PostForm
+from ..images import ORIENTATION
+from ..models import Post
+from ..thumbnails import FORMATS, SPECS, prefetch, thumbnail_file, variants
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def make_image(name='image.jpg', size=(40, 30), fmt='JPEG', **options):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, fmt, **options)
+    return SimpleUploadedFile(
+        name=name,
+        content=buffer.getvalue(),
+        content_type=f'image/{fmt.lower()}',
+    )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_PREGENERATE=False)
+class ThumbnailCommandTest(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        default.kvstore.local.clear()
+
+    def test_backfill_generates_and_resumes(self):
+        posts = [
+            Post.objects.create(
+                author=self.author, text='Текст', image=make_image()
+            )
+            for _ in range(3)
+        ]
+        state = os.path.join(TEMP_MEDIA_ROOT, 'state')
+        out = StringIO()
+        call_command(
+            'generate_thumbnails',
+            workers=2,
+            chunk_size=2,
+            state_file=state,
+            stdout=out,
+        )
+        self.assertIn('Обработано: 3, ошибок: 0', out.getvalue())
+        self.assertTrue(
+            os.listdir(os.path.join(TEMP_MEDIA_ROOT, 'cache'))
+        )
+        with open(state) as progress:
+            self.assertEqual(json.load(progress)['last_pk'], posts[-1].pk)
+        out = StringIO()
+        call_command('generate_thumbnails', state_file=state, stdout=out)
+        self.assertIn('Обработано: 0, ошибок: 0', out.getvalue())
+
+    def test_failed_posts_are_retried(self):
+        post = Post.objects.create(
+            author=self.author, text='Текст', image=make_image()
+        )
+        state = os.path.join(TEMP_MEDIA_ROOT, 'retry-state')
+        out = StringIO()
+        with mock.patch(
+            'posts.management.commands.generate_thumbnails.generate',
+            return_value=False,
+        ):
+            call_command('generate_thumbnails', state_file=state, stdout=out)
+        self.assertIn('Обработано: 0, ошибок: 1', out.getvalue())
+        out = StringIO()
+        call_command('generate_thumbnails', state_file=state, stdout=out)
+        self.assertIn('Обработано: 1, ошибок: 0', out.getvalue())
+        with open(state) as progress:
+            self.assertEqual(
+                json.load(progress), {'last_pk': post.pk, 'failed': []}
+            )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_PREGENERATE=False)
+class ThumbnailKVStoreTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        default.kvstore.local.clear()
+
+    def test_prefetch_loads_page_in_one_lookup(self):
+        posts = [
+            Post.objects.create(
+                author=self.author, text='Текст', image=make_image(size=size)
+            )
+            for size in ((40, 30), (30, 40))
+        ]
+        geometry, options = SPECS[0]
+        for post in posts:
+            thumbnail = get_thumbnail(post.image, geometry, **options)
+            self.assertEqual(
+                thumbnail_file(post.image, geometry, options).name,
+                thumbnail.name,
+            )
+        kvstore = KVStore()
+        files = [
+            thumbnail_file(post.image, geometry, options) for post in posts
+        ]
+        self.assertEqual(kvstore.prefetch(files), 2)
+        for image_file in files:
+            self.assertIsNotNone(
+                kvstore.local.get(add_prefix(image_file.key))
+            )
+        self.assertEqual(kvstore.prefetch(files), 0)
+        default.kvstore.local.clear()
+        self.assertEqual(prefetch(posts), 2)
+
+    def test_lru_is_bounded(self):
+        kvstore = KVStore()
+        kvstore.local.size = 2
+        a, b, c = (add_prefix(key) for key in 'abc')
+        for key in (a, b, c):
+            kvstore._set_raw(key, key)
+        self.assertEqual(len(kvstore.local.data), 2)
+        self.assertIsNone(kvstore.local.get(a))
+        self.assertEqual(kvstore._get_raw(a), a)
+        kvstore._delete_raw(a)
+        self.assertIsNone(kvstore._get_raw(a))
+
+    def test_thumbnail_lists_are_not_kept_locally(self):
+        kvstore = KVStore()
+        key = add_prefix('a', 'thumbnails')
+        kvstore._set_raw(key, '["x"]')
+        self.assertIsNone(kvstore.local.get(key))
+        self.assertEqual(kvstore._get_raw(key), '["x"]')
+
+    def test_clear_switches_generation(self):
+        kvstore = KVStore()
+        key = add_prefix('a')
+        kvstore._set_raw(key, 'a')
+        kvstore.clear()
+        self.assertIsNone(kvstore._get_raw(key))
+
+    def test_migrate_command_copies_db_rows(self):
+        key = add_prefix('abc')
+        KVStoreModel.objects.create(key=key, value='{"name": "x"}')
+        out = StringIO()
+        call_command('migrate_thumbnail_kvstore', delete=True, stdout=out)
+        self.assertIn('Перенесено записей: 1', out.getvalue())
+        self.assertEqual(KVStore()._get_raw(key), '{"name": "x"}')
+        self.assertFalse(KVStoreModel.objects.exists())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_PREGENERATE=False)
+class PostImageVariantsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(
+            author=cls.author, text='Текст', image=make_image(size=(1600, 800))
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        default.kvstore.local.clear()
+
+    def test_variants_cover_every_width(self):
+        image = variants(self.post.image)
+        self.assertEqual((image['width'], image['height']), ('960', '339'))
+        for width in settings.POST_IMAGE_WIDTHS:
+            self.assertIn(f' {width}w', image['srcset'])
+        self.assertEqual(len(image['sources']), len(FORMATS) - 1)
+
+    def test_small_images_are_not_upscaled(self):
+        post = Post.objects.create(
+            author=self.author, text='Текст', image=make_image(size=(600, 300))
+        )
+        image = variants(post.image)
+        self.assertEqual(image['width'], '600')
+        self.assertEqual(
+            [part.rsplit(' ', 1)[1] for part in image['srcset'].split(', ')],
+            ['480w', '600w'],
+        )
+
+    @override_settings(POST_IMAGE_DEFAULT_WIDTH=1000)
+    def test_default_width_outside_the_list(self):
+        self.assertEqual(variants(self.post.image)['width'], '960')
+
+    def test_feed_renders_srcset(self):
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'srcset=')
+        self.assertContains(response, 'width="960" height="339"')
+        self.assertContains(response, settings.POST_IMAGE_SIZES)
+
+
+@override_settings(POST_IMAGE_MAX_SIZE=(100, 100))
+class ImageNormalizationTest(TestCase):
+    def clean(self, upload):
+        form = PostForm(data={'text': 'Текст'}, files={'image': upload})
+        self.assertTrue(form.is_valid(), form.errors)
+        return form.cleaned_data['image']
+
+    def test_jpeg_is_rotated_downscaled_and_stripped(self):
+        exif = Image.Exif()
+        exif[ORIENTATION] = 6
+        image = self.clean(
+            make_image('photo.jpeg', (300, 150), exif=exif.tobytes())
+        )
+        self.assertEqual(image.name, 'photo.jpg')
+        with Image.open(image) as result:
+            self.assertEqual(result.size, (50, 100))
+            self.assertNotIn(ORIENTATION, result.getexif())
+
+    def test_transparent_png_stays_png(self):
+        buffer = BytesIO()
+        Image.new('RGBA', (200, 50), (255, 0, 0, 0)).save(buffer, 'PNG')
+        image = self.clean(
+            SimpleUploadedFile('logo.png', buffer.getvalue(), 'image/png')
+        )
+        self.assertEqual(image.name, 'logo.png')
+        with Image.open(image) as result:
+            self.assertEqual((result.format, result.size), ('PNG', (100, 25)))
+
+    def test_gif_is_kept_as_is(self):
+        upload = make_image('anim.gif', fmt='GIF')
+        content = upload.read()
+        upload.seek(0)
+        self.assertEqual(self.clean(upload).read(), content)
+
+    def test_unreadable_images_are_form_errors(self):
+        truncated = make_image('broken.jpg', (300, 150))
+        truncated = SimpleUploadedFile(
+            'broken.jpg', truncated.read()[:600], 'image/jpeg'
+        )
+        form = PostForm(data={'text': 'Текст'}, files={'image': truncated})
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+        with mock.patch.object(
+            Image.Image, 'thumbnail',
+            side_effect=Image.DecompressionBombError,
+        ):
+            form = PostForm(
+                data={'text': 'Текст'}, files={'image': make_image()}
+            )
+            self.assertFalse(form.is_valid())
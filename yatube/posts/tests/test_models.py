@@ -1,8 +1,11 @@
 # posts/tests/tests_url.py
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 
-from ..models import Group, Post
+from ..models import Comment, Follow, Group, Post, UserCounters
 
 User = get_user_model()
 
@@ -28,6 +31,37 @@ class PostModelTest(TestCase):
                 self.assertEqual(str(field), expected_value)
 
 
+class PostTextTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    def test_save_renders_text(self):
+        post = Post.objects.create(
+            author=self.user, text='<b>Привет</b>\n\nВторой абзац'
+        )
+        self.assertEqual(
+            post.text_html,
+            '<p>&lt;b&gt;Привет&lt;/b&gt;</p>\n\n<p>Второй абзац</p>',
+        )
+        post.text = ' '.join(['слово'] * 40)
+        post.save(update_fields=['text'])
+        post.refresh_from_db()
+        self.assertEqual(post.summary, ' '.join(['слово'] * 30) + ' …')
+        self.assertIn('слово', post.text_html)
+
+    def test_backfill_command(self):
+        post = Post.objects.create(author=self.user, text='Текст')
+        Post.objects.filter(pk=post.pk).update(text_html='', summary='')
+        out = StringIO()
+        call_command('render_post_text', batch_size=1, stdout=out)
+        self.assertIn('Готово, постов: 1', out.getvalue())
+        post.refresh_from_db()
+        self.assertEqual(post.text_html, '<p>Текст</p>')
+        self.assertEqual(post.summary, 'Текст')
+
+
 class GroupModelTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -48,3 +82,81 @@ class GroupModelTest(TestCase):
         for field, expected_value in fields.items():
             with self.subTest(field=field):
                 self.assertEqual(str(field), expected_value)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='title',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def counters(self, user):
+        return UserCounters.objects.get(user=user)
+
+    def test_counters_follow_writes(self):
+        post = Post.objects.create(
+            author=self.author, text='text', group=self.group
+        )
+        Comment.objects.create(post=post, author=self.reader, text='text')
+        Follow.objects.create(user=self.reader, author=self.author)
+        post.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(self.counters(self.author).posts_count, 1)
+        self.assertEqual(self.counters(self.author).followers_count, 1)
+        self.assertEqual(self.counters(self.reader).following_count, 1)
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(post.comments_count, 1)
+
+        post.group = None
+        post.save()
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+
+        Follow.objects.all().delete()
+        post.delete()
+        self.assertEqual(self.counters(self.author).posts_count, 0)
+        self.assertEqual(self.counters(self.author).followers_count, 0)
+        self.assertEqual(self.counters(self.reader).following_count, 0)
+
+    def test_save_keeps_concurrent_comment_count(self):
+        post = Post.objects.create(author=self.author, text='text')
+        stale = Post.objects.get(pk=post.pk)
+        Comment.objects.create(post=post, author=self.reader, text='text')
+        stale.text = 'Новый текст'
+        stale.save()
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Новый текст')
+        self.assertEqual(post.comments_count, 1)
+
+    def test_full_save_still_inserts(self):
+        post = Post.objects.create(author=self.author, text='text')
+        post.pk = None
+        post.save()
+        self.assertEqual(Post.objects.count(), 2)
+        stale = Post.objects.get(pk=post.pk)
+        stale.comments_count = 5
+        Post.objects.filter(pk=post.pk).delete()
+        stale.save()
+        self.assertEqual(Post.objects.get(pk=post.pk).comments_count, 5)
+
+    def test_recount_command_fixes_drift(self):
+        post = Post.objects.create(
+            author=self.author, text='text', group=self.group
+        )
+        UserCounters.objects.update(posts_count=7)
+        Group.objects.update(posts_count=0)
+        Post.objects.update(comments_count=3)
+        UserCounters.objects.filter(user=self.reader).delete()
+        call_command('recount_counters', chunk_size=1, stdout=StringIO())
+        post.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(self.counters(self.author).posts_count, 1)
+        self.assertEqual(self.counters(self.reader).posts_count, 0)
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(post.comments_count, 0)
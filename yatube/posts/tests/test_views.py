@@ -1,11 +1,27 @@
+import json
+from io import StringIO
+from unittest import mock
+
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import Client, TestCase, override_settings
+from django.template.loader import get_template
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django import forms
 from django.core.files.uploadedfile import SimpleUploadedFile
 
+from core.query_budget import query_budget
+
+from core.versions import versions
+from ..cards import card_key, render_cards
+from ..feed_cache import FEED, group_scope
+from ..feeds import feed_posts
 from ..forms import PostForm
-from ..models import Follow, Group, Post, Comment
+from ..models import Follow, Group, Post, Comment, TimelineEntry
+from ..paginators import CursorPage
 
 User = get_user_model()
 
@@ -155,13 +171,29 @@ class Views(TestCase):
         self.assertEqual(response_2.context['is_edit'], True)
 
     def test_cache(self):
-        post_count = Post.objects.count()
+        cache.clear()
         content = self.client.get(reverse('posts:index')).content
-        Post.objects.filter(id=1).delete()
+        Post.objects.filter(id=self.post.id).update(text='Новый текст')
+        content_cached = self.client.get(reverse('posts:index')).content
+        self.assertEqual(content, content_cached)
+        Post.objects.filter(id=self.post.id).delete()
         content_after_delete = self.client.get(reverse('posts:index')).content
-        post_2 = Post.objects.count()
-        self.assertEqual(content, content_after_delete)
-        self.assertNotEqual(post_count, post_2)
+        self.assertNotEqual(content, content_after_delete)
+
+    def test_cache_varies_by_page(self):
+        cache.clear()
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Пост {i}') for i in range(11)
+        )
+        feeds = (
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+        )
+        for url in feeds:
+            with self.subTest(url=url):
+                first = self.client.get(url).content
+                second = self.client.get(url, {'page': 2}).content
+                self.assertTrue(first != second)
 
     def test_comments_on_post_detail_page(self):
         comment_text = 'Testing comment'
@@ -221,3 +253,710 @@ class Views(TestCase):
                 user=self.follower,
                 author=self.user).exists()
         )
+
+
+class CursorPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Заголовок',
+            slug='test-slug',
+            description='Текст',
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.author, group=cls.group, text=f'Пост {i}')
+            for i in range(13)
+        )
+        cls.expected = list(
+            Post.objects.order_by('-pub_date', '-id').values_list(
+                'id', flat=True
+            )
+        )
+
+    def setUp(self):
+        self.client = Client()
+
+    def ids(self, page_obj):
+        return [post.id for post in page_obj]
+
+    @override_settings(CURSOR_PAGINATION=True)
+    def test_cursor_pages_walk_the_feed(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                first = self.client.get(url).context['page_obj']
+                self.assertIsInstance(first, CursorPage)
+                self.assertEqual(self.ids(first), self.expected[:10])
+                self.assertFalse(first.has_previous())
+                second = self.client.get(
+                    url, {'after': first.next_cursor}
+                ).context['page_obj']
+                self.assertEqual(self.ids(second), self.expected[10:])
+                self.assertFalse(second.has_next())
+                back = self.client.get(
+                    url, {'before': second.previous_cursor}
+                ).context['page_obj']
+                self.assertEqual(self.ids(back), self.expected[:10])
+
+    def test_broken_cursor_returns_first_page(self):
+        response = self.client.get(
+            reverse('posts:index'), {'after': 'не-курсор'}
+        )
+        page_obj = response.context['page_obj']
+        self.assertIsInstance(page_obj, CursorPage)
+        self.assertEqual(self.ids(page_obj), self.expected[:10])
+
+
+class FollowTimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.follower = User.objects.create_user(username='follower')
+
+    def setUp(self):
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
+
+    def feed(self):
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        return [post.text for post in response.context['page_obj']]
+
+    def test_timeline_follows_the_graph(self):
+        Post.objects.create(author=self.author, text='До подписки')
+        self.follower_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': 'author'}
+        ))
+        Post.objects.create(author=self.author, text='После подписки')
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.follower).count(), 2
+        )
+        self.assertEqual(self.feed(), ['После подписки', 'До подписки'])
+        self.follower_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': 'author'}
+        ))
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed(), [])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_heavy_author_is_read_on_demand(self):
+        Follow.objects.create(user=self.follower, author=self.author)
+        Post.objects.create(author=self.author, text='Пост')
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed(), ['Пост'])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2)
+    def test_heavy_author_stays_heavy_after_unfollow(self):
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=self.follower, author=self.author)
+        Follow.objects.create(user=other, author=self.author)
+        Post.objects.create(author=self.author, text='Пост')
+        Follow.objects.filter(user=other).delete()
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed(), ['Пост'])
+
+
+class FollowStateTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.follower = User.objects.create_user(username='follower')
+
+    def setUp(self):
+        cache.clear()
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
+        self.profile = reverse(
+            'posts:profile', kwargs={'username': 'author'}
+        )
+
+    def test_follow_is_unique(self):
+        Follow.objects.create(user=self.follower, author=self.author)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=self.follower, author=self.author)
+
+    def test_follow_state_comes_from_cache(self):
+        response = self.follower_client.get(self.profile)
+        self.assertFalse(response.context['following'])
+        self.follower_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': 'author'}
+        ))
+        self.follower_client.get(self.profile)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.follower_client.get(self.profile)
+        self.assertTrue(response.context['following'])
+        self.assertFalse(
+            [q for q in queries if 'posts_follow' in q['sql']]
+        )
+        self.follower_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': 'author'}
+        ))
+        response = self.follower_client.get(self.profile)
+        self.assertFalse(response.context['following'])
+
+
+class FeedFragmentKeyTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.first = User.objects.create_user(username='first')
+        cls.second = User.objects.create_user(username='second')
+        for user, slug in ((cls.first, 'g1'), (cls.second, 'g2')):
+            group = Group.objects.create(title=slug, slug=slug)
+            Post.objects.create(
+                author=user, group=group, text=f'Пост {user.username}'
+            )
+        Follow.objects.create(user=cls.first, author=cls.first)
+        Follow.objects.create(user=cls.second, author=cls.second)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_equal_versions_of_different_scopes_do_not_share_fragment(self):
+        pages = (
+            ('posts:follow_index', {}, {}),
+            ('posts:group_list', {'slug': 'g1'}, {'slug': 'g2'}),
+            ('posts:profile', {'username': 'first'}, {'username': 'second'}),
+        )
+        with mock.patch('core.versions.fresh_version', return_value=1):
+            for name, first, second in pages:
+                with self.subTest(name=name):
+                    self.client.force_login(self.first)
+                    self.client.get(reverse(name, kwargs=first))
+                    self.client.force_login(self.second)
+                    response = self.client.get(reverse(name, kwargs=second))
+                    self.assertContains(response, 'Пост second')
+                    self.assertNotContains(response, 'Пост first')
+
+
+@override_settings(PAGE_CACHE_ENABLED=True)
+class AnonymousPageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Текст')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+
+    def test_anonymous_pages_are_cached_until_write(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertIn('public', response['Cache-Control'])
+                self.assertIn('Cookie', response['Vary'])
+                self.assertIsNone(self.guest_client.get(url).context)
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий'
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertIsNotNone(self.guest_client.get(url).context)
+
+    def test_follow_refreshes_follower_profile(self):
+        follower = User.objects.create_user(username='follower')
+        follower_client = Client()
+        follower_client.force_login(follower)
+        url = reverse('posts:profile', kwargs={'username': 'follower'})
+        self.guest_client.get(url)
+        self.assertIsNone(self.guest_client.get(url).context)
+        for action in ('posts:profile_follow', 'posts:profile_unfollow'):
+            with self.subTest(action=action):
+                follower_client.get(
+                    reverse(action, kwargs={'username': 'author'})
+                )
+                self.assertIsNotNone(self.guest_client.get(url).context)
+                self.assertIsNone(self.guest_client.get(url).context)
+
+    def test_authorized_pages_are_private(self):
+        url = reverse('posts:index')
+        self.authorized_client.get(url)
+        response = self.authorized_client.get(url)
+        self.assertIsNotNone(response.context)
+        self.assertIn('private', response['Cache-Control'])
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Заголовок',
+            slug='test-slug',
+            description='Текст',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, text='Текст', group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_unchanged_pages_answer_not_modified(self):
+        urls = (
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                etag = response['ETag']
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, 304)
+                Comment.objects.create(
+                    post=self.post, author=self.author, text='Новый'
+                )
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, 200)
+
+    def test_only_post_page_sends_last_modified(self):
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        self.assertTrue(self.guest_client.get(url).has_header('Last-Modified'))
+        url = reverse('posts:profile', kwargs={'username': 'author'})
+        self.assertFalse(
+            self.guest_client.get(url).has_header('Last-Modified')
+        )
+
+    def test_renames_change_post_page_etag(self):
+        commenter = User.objects.create_user(username='commenter')
+        Comment.objects.create(
+            post=self.post, author=commenter, text='Комментарий'
+        )
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+
+        def rename_group():
+            self.group.title = 'Новый заголовок'
+            self.group.save()
+
+        def rename(user):
+            user = User.objects.get(pk=user.pk)
+            user.username = f'{user.username}-new'
+            user.save()
+
+        changes = (
+            rename_group,
+            lambda: rename(self.author),
+            lambda: rename(commenter),
+            Group.objects.get(pk=self.group.pk).delete,
+        )
+        for change in changes:
+            with self.subTest(change=change):
+                etag = self.guest_client.get(url)['ETag']
+                change()
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, 200)
+
+    def test_delete_and_move_change_etag(self):
+        other = Group.objects.create(title='Другая', slug='other')
+        moved, deleted = (
+            Post.objects.create(
+                author=self.author, text=text, group=self.group
+            )
+            for text in ('Перенесённый', 'Удалённый')
+        )
+        urls = (
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+        )
+
+        def move():
+            moved.group = other
+            moved.save()
+
+        changes = (move, deleted.delete)
+        for change in changes:
+            etags = [self.guest_client.get(url)['ETag'] for url in urls]
+            change()
+            for url, etag in zip(urls, etags):
+                with self.subTest(url=url, change=change):
+                    response = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=etag
+                    )
+                    self.assertEqual(response.status_code, 200)
+
+    def test_comment_touches_post(self):
+        updated = self.post.updated
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий'
+        )
+        self.post.refresh_from_db()
+        self.assertGreater(self.post.updated, updated)
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.title = Post.objects.create(
+            author=cls.author, text='Заметки о горных походах'
+        )
+        cls.commented = Post.objects.create(
+            author=cls.author, text='Фотографии'
+        )
+        Comment.objects.create(
+            post=cls.commented, author=cls.author, text='Красивые горы'
+        )
+        Post.objects.create(author=cls.author, text='Рецепт пирога')
+
+    def setUp(self):
+        cache.clear()
+
+    def found(self, query, **params):
+        response = self.client.get(
+            reverse('posts:search'), {'q': query, **params}
+        )
+        return response, list(response.context['page_obj'])
+
+    def test_finds_posts_and_comments_by_rank(self):
+        _, posts = self.found('гор')
+        self.assertEqual(posts, [self.title, self.commented])
+        _, posts = self.found('"OR(*')
+        self.assertEqual(posts, [])
+
+    @override_settings(AMOUNT_POSTS=1)
+    def test_keyset_pages(self):
+        response, posts = self.found('гор')
+        self.assertEqual(posts, [self.title])
+        cursor = response.context['page_obj'].next_cursor
+        response, posts = self.found('гор', after=cursor)
+        self.assertEqual(posts, [self.commented])
+        self.assertFalse(response.context['page_obj'].has_next())
+
+    def test_comments_are_indexed_one_by_one(self):
+        comment = Comment.objects.create(
+            post=self.title, author=self.author, text='Озеро'
+        )
+        with CaptureQueriesContext(connection) as queries:
+            comment.text = 'Ледник'
+            comment.save()
+        self.assertFalse(any(
+            'INTO posts_search (' in query['sql'] for query in queries
+        ))
+        _, posts = self.found('ледник')
+        self.assertEqual(posts, [self.title])
+        _, posts = self.found('озеро')
+        self.assertEqual(posts, [])
+
+    def test_index_follows_changes(self):
+        post = Post.objects.get(pk=self.title.pk)
+        post.text = 'Заметки о море'
+        post.save()
+        Comment.objects.filter(post=self.commented).delete()
+        _, posts = self.found('гор')
+        self.assertEqual(posts, [])
+        post.delete()
+        _, posts = self.found('море')
+        self.assertEqual(posts, [])
+
+    def test_rebuild_and_admin_search(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM posts_search')
+            cursor.execute('DELETE FROM posts_comment_search')
+        call_command('rebuild_search_index', batch_size=2, stdout=StringIO())
+        _, posts = self.found('красивые')
+        self.assertEqual(posts, [self.commented])
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'пирог'}
+        )
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+
+@override_settings(COMMENTS_PER_PAGE=10)
+class CommentPagesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.post = Post.objects.create(
+            author=User.objects.create_user(username='author'),
+            text='Текст',
+        )
+        readers = [
+            User.objects.create_user(username=f'reader{i}') for i in range(3)
+        ]
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=readers[i % 3], text=f'Ответ {i}')
+            for i in range(25)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_first_page_is_bounded(self):
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        comments = response.context['comments']
+        self.assertEqual(len(comments), 10)
+        self.assertTrue(comments.has_next())
+        self.assertContains(response, 'Показать ещё')
+        Comment.objects.create(
+            post=self.post,
+            author=User.objects.get(username='reader0'),
+            text='Ещё',
+        )
+        with CaptureQueriesContext(connection) as more:
+            self.client.get(url)
+        self.assertEqual(len(more), len(queries))
+
+    def test_load_more_fragment(self):
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.id})
+        seen = []
+        after = None
+        while True:
+            response = self.client.get(url, {'after': after or ''})
+            comments = response.context['comments']
+            seen.extend(comment.pk for comment in comments)
+            if not comments.has_next():
+                break
+            after = comments.next_cursor
+        self.assertNotContains(response, 'Показать ещё')
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len(set(seen)), 25)
+
+
+class FeedQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        for i in range(12):
+            author = User.objects.create_user(
+                username=f'author{i}', first_name='Имя', last_name='Фамилия'
+            )
+            Follow.objects.create(user=cls.reader, author=author)
+            Post.objects.create(author=author, group=cls.group, text='Текст')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def test_feed_query_counts(self):
+        # Сессия и пользователь + страница ленты; от числа постов не зависит.
+        pages = (
+            (reverse('posts:index'), 4),
+            (reverse('posts:group_list', kwargs={'slug': 'group'}), 6),
+            (reverse('posts:profile', kwargs={'username': 'author0'}), 7),
+            (reverse('posts:follow_index'), 5),
+        )
+        for url, expected in pages:
+            with self.subTest(url=url):
+                with self.assertNumQueries(expected):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+
+class QueryBudgetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        Post.objects.create(author=cls.author, text='Текст')
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(QUERY_STATS_HEADERS=True)
+    def test_stats_headers(self):
+        with self.assertLogs('core.query_budget', 'INFO') as logs:
+            response = self.client.get(reverse('posts:index'))
+        self.assertGreater(int(response['X-DB-Queries']), 0)
+        self.assertEqual(response['X-DB-Duplicates'], '0')
+        self.assertIn('"path": "/"', logs.output[0])
+
+    @override_settings(QUERY_BUDGET=0)
+    def test_over_budget_is_warning(self):
+        with self.assertLogs('core.query_budget', 'WARNING'):
+            self.client.get(reverse('posts:index'))
+
+    def test_budget_helper(self):
+        with query_budget(2, max_duplicates=0) as stats:
+            list(Post.objects.all())
+        self.assertEqual(stats.count, 1)
+        with self.assertRaises(AssertionError):
+            with query_budget(5, max_duplicates=0):
+                for _ in range(2):
+                    list(Post.objects.filter(pk__in=[1, 2]))
+
+
+class ReadApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {i}'
+            )
+            for i in range(5)
+        ]
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def lines(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response['Content-Type'].split(';')[0],
+                         'application/x-ndjson')
+        body = b''.join(response.streaming_content).decode()
+        return [json.loads(line) for line in body.splitlines()]
+
+    def test_export_pages_with_cursor_and_fields(self):
+        url = reverse('posts:api_group_posts', kwargs={'slug': 'group'})
+        first = self.lines(url, limit=3, fields='id,author')
+        self.assertEqual(
+            first[:3],
+            [{'id': post.pk, 'author': 'author'}
+             for post in reversed(self.posts[2:])],
+        )
+        second = self.lines(url, limit=3, fields='id', after=first[3]['next'])
+        self.assertEqual(
+            second, [{'id': post.pk} for post in reversed(self.posts[:2])]
+        )
+
+    def test_author_follow_and_single_post(self):
+        url = reverse('posts:api_author_posts', kwargs={'username': 'author'})
+        self.assertEqual(len(self.lines(url)), 5)
+        follow = reverse('posts:api_follow_posts')
+        self.assertEqual(self.client.get(follow).status_code, 401)
+        self.client.force_login(self.reader)
+        self.assertEqual(len(self.lines(follow, fields='text')), 5)
+        response = self.client.get(
+            reverse('posts:api_post', kwargs={'post_id': self.posts[0].pk}),
+            {'fields': 'text,group'},
+        )
+        self.assertEqual(response.json(), {'text': 'Пост 0', 'group': 'group'})
+
+    def test_bad_requests(self):
+        url = reverse('posts:api_group_posts', kwargs={'slug': 'group'})
+        for params in ({'fields': 'password'}, {'after': 'мусор'}):
+            with self.subTest(params=params):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', first_name='Анна'
+        )
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        for number in range(3):
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {number}'
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def render(self):
+        posts = list(feed_posts())
+        with mock.patch(
+            'posts.cards.get_template', wraps=get_template
+        ) as loader, mock.patch(
+            'posts.cards.cache.get_many', wraps=cache.get_many
+        ) as get_many:
+            cards = render_cards(posts)
+        get_many.assert_called_once()
+        return cards, loader.call_count
+
+    def test_cards_rendered_once_then_read_from_cache(self):
+        cards, renders = self.render()
+        self.assertEqual(renders, 1)
+        self.assertEqual(len(cards), 3)
+        post = Post.objects.first()
+        self.assertIn(post.text, cards[post.pk])
+        self.assertIn('Анна', cards[post.pk])
+        self.assertEqual(self.render()[1], 0)
+
+    def test_edit_and_renames_change_the_card(self):
+        self.render()
+        post = Post.objects.first()
+        self.client.force_login(self.author)
+        self.client.post(
+            reverse('posts:post_edit', args=[post.pk]),
+            {'text': 'Исправлено', 'group': self.group.pk},
+        )
+        cards, renders = self.render()
+        self.assertEqual(renders, 1)
+        self.assertIn('Исправлено', cards[post.pk])
+
+        self.group.title = 'Новое название'
+        self.group.save()
+        cards, _ = self.render()
+        self.assertIn('Новое название', cards[post.pk])
+
+        self.author.first_name = 'Мария'
+        self.author.save()
+        cards, _ = self.render()
+        self.assertIn('Мария', cards[post.pk])
+
+    def test_image_switch_changes_the_card(self):
+        post = feed_posts().first()
+        key = card_key(post)
+        Post.objects.filter(pk=post.pk).update(image='posts/new.jpg')
+        self.assertNotEqual(card_key(feed_posts().get(pk=post.pk)), key)
+
+    def test_password_change_keeps_feed_versions(self):
+        author = User.objects.get(pk=self.author.pk)
+        before = versions(FEED)
+        author.set_password('new-password')
+        author.save()
+        self.assertEqual(versions(FEED), before)
+        author.last_name = 'Иванова'
+        author.save()
+        self.assertNotEqual(versions(FEED), before)
+
+    def test_move_bumps_both_groups_with_loaded_relations(self):
+        other = Group.objects.create(title='Другая', slug='other')
+        post = Post.objects.select_related('author', 'group').first()
+        scopes = (group_scope(self.group.slug), group_scope(other.slug))
+        before = versions(*scopes)
+        post.group = other
+        with CaptureQueriesContext(connection) as queries:
+            post.save()
+        for query in queries.captured_queries:
+            self.assertNotIn('FROM "auth_user"', query['sql'])
+            self.assertNotIn('FROM "posts_group"', query['sql'])
+        after = versions(*scopes)
+        self.assertNotEqual(after[0], before[0])
+        self.assertNotEqual(after[1], before[1])
@@ -0,0 +1,138 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from PIL import features
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+logger = logging.getLogger(__name__)
+
+# Пропорции кадра картинки поста в ленте.
+RATIO = (960, 339)
+# WebP отдаётся, только если Pillow собран с его поддержкой.
+FORMATS = ('WEBP', 'JPEG') if features.check('webp') else ('JPEG',)
+
+
+def geometry(width):
+    return f'{width}x{round(width * RATIO[1] / RATIO[0])}'
+
+
+# Все варианты, которые запрашивает тег {% post_image %}, по возрастанию
+# ширины. Маленькие картинки не растягиваются.
+SPECS = tuple(
+    (geometry(width), {'crop': 'center', 'upscale': False, 'format': fmt})
+    for fmt in FORMATS
+    for width in sorted(settings.POST_IMAGE_WIDTHS)
+)
+
+_executor = None
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails',
+        )
+    return _executor
+
+
+def variants(image):
+    """srcset по форматам и основной JPEG-вариант картинки поста.
+
+    Ширины больше исходной не запрашиваются: без увеличения они дали бы
+    ту же картинку. Основной вариант — самый широкий JPEG не шире
+    POST_IMAGE_DEFAULT_WIDTH, иначе самый узкий.
+    """
+    found = {fmt: [] for fmt in FORMATS}
+    for size, options in SPECS:
+        thumbnails = found[options['format']]
+        # (запрошенная ширина, ширина, высота, url); предыдущая вышла
+        # уже запрошенной — исходник кончился, шире не будет.
+        if thumbnails and thumbnails[-1][1] < thumbnails[-1][0]:
+            continue
+        thumbnail = get_thumbnail(image, size, **options)
+        requested = [int(part) for part in size.split('x')]
+        # У миниатюры битого исходника размера нет, берём запрошенный.
+        width, height = thumbnail.size or requested
+        thumbnails.append((requested[0], width, height, thumbnail.url))
+    srcsets = {
+        fmt: ', '.join(f'{url} {width}w' for _, width, _, url in thumbnails)
+        for fmt, thumbnails in found.items()
+    }
+    jpeg = found['JPEG']
+    fitting = [
+        variant for variant in jpeg
+        if variant[1] <= settings.POST_IMAGE_DEFAULT_WIDTH
+    ]
+    _, width, height, src = fitting[-1] if fitting else jpeg[0]
+    sources = [
+        {'type': f'image/{fmt.lower()}', 'srcset': srcsets[fmt]}
+        for fmt in FORMATS if fmt != 'JPEG'
+    ]
+    return {
+        'sources': sources,
+        'srcset': srcsets['JPEG'],
+        'src': src,
+        'width': str(width),
+        'height': str(height),
+    }
+
+
+def generate(name):
+    """Создаёт все миниатюры картинки, если их ещё нет."""
+    try:
+        for geometry, options in SPECS:
+            get_thumbnail(name, geometry, **options)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', name)
+        return False
+    finally:
+        close_old_connections()
+    return True
+
+
+def schedule(post):
+    """Ставит миниатюры поста в очередь после фиксации транзакции."""
+    if not post.image or not settings.THUMBNAIL_PREGENERATE:
+        return
+    name = post.image.name
+    transaction.on_commit(lambda: executor().submit(generate, name))
+
+
+def thumbnail_file(image, geometry, options):
+    """Файл миниатюры, который вернёт get_thumbnail, без обращения к KV.
+
+    Повторяет разбор опций из ThumbnailBackend.get_thumbnail.
+    """
+    backend = default.backend
+    source = ImageFile(image)
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return ImageFile(name, default.storage)
+
+
+def prefetch(posts):
+    """Одним запросом достаёт из KV записи миниатюр всех постов страницы."""
+    kvstore = default.kvstore
+    if not hasattr(kvstore, 'prefetch'):
+        return 0
+    files = [
+        thumbnail_file(post.image, geometry, options)
+        for post in posts if post.image
+        for geometry, options in SPECS
+    ]
+    return kvstore.prefetch(files) if files else 0
@@ -0,0 +1,98 @@
+from django.conf import settings
+from django.db.models import F, Q
+
+from .models import Follow, Post, TimelineEntry, UserCounters
+
+
+def is_heavy_author(author_id):
+    """Автор, для которого fan-out на запись не делаем."""
+    return UserCounters.objects.filter(
+        user_id=author_id, fanout_on_read=True
+    ).exists()
+
+
+def heavy_followee_ids(user):
+    return Follow.objects.filter(
+        user=user, author__counters__fanout_on_read=True
+    ).values_list('author', flat=True)
+
+
+def promote(*author_ids):
+    """Переводит набравших TIMELINE_FANOUT_LIMIT подписчиков авторов на
+    fan-out при чтении. Без аргументов проверяет всех.
+    """
+    heavy = UserCounters.objects.filter(
+        fanout_on_read=False,
+        followers_count__gte=settings.TIMELINE_FANOUT_LIMIT,
+    )
+    if author_ids:
+        heavy = heavy.filter(user_id__in=author_ids)
+    return heavy.update(fanout_on_read=True)
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if is_heavy_author(post.author_id):
+        return
+    follower_ids = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user', flat=True)
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user_id,
+                post=post,
+                author_id=post.author_id,
+                pub_date=post.pub_date,
+            )
+            for user_id in follower_ids.iterator()
+        ),
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту свежие посты автора после подписки."""
+    if is_heavy_author(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date'
+    ).values_list('pk', 'pub_date')[:settings.TIMELINE_BACKFILL]
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user_id,
+                post_id=post_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for post_id, pub_date in posts
+        ),
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def trim(user_id, author_id):
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def timeline_posts(user):
+    """Лента подписок: материализованные записи плюс посты тяжёлых авторов,
+    которые читаются напрямую (fan-out на чтение).
+
+    Дата ленты — аннотация timeline_date: без тяжёлых авторов это
+    TimelineEntry.pub_date, и сортировка идёт по индексу (user, -pub_date).
+    """
+    heavy = list(heavy_followee_ids(user))
+    if not heavy:
+        posts = Post.objects.filter(timeline_entries__user=user).annotate(
+            timeline_date=F('timeline_entries__pub_date')
+        )
+    else:
+        posts = Post.objects.filter(
+            Q(pk__in=TimelineEntry.objects.filter(user=user).values('post'))
+            | Q(author_id__in=heavy)
+        ).annotate(timeline_date=F('pub_date'))
+    return posts.order_by('-timeline_date', '-pk')
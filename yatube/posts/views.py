@@ -1,62 +1,79 @@
-from django.shortcuts import render, get_object_or_404, redirect
 from django.conf import settings
+from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+
+from core.page_cache import cache_policy
 
 from .forms import PostForm, CommentForm
 from .models import Post, Group, User, Follow
-
-
+from .conditional import conditional, group_state, post_state, profile_state
+from .counters import user_counters
+from .feed_cache import (
+    FEED, author_scope, feed_context, follow_scope, group_scope, post_scope
+)
+from .feeds import feed_posts
+from .followees import is_following
+from .paginators import CursorPaginator, InvalidCursor, paginate
+from .search import search
+from .thumbnails import schedule as schedule_thumbnails
+from .timeline import timeline_posts
+
+
+@cache_policy(max_age=60, scopes=lambda: (FEED,))
 def index(request):
-    posts = Post.objects.select_related('author', 'group')
-    paginator = Paginator(posts, settings.AMOUNT_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    feed = feed_context(request, 'index', FEED)
+    posts = feed_posts()
+    page_obj = paginate(request, posts)
     template = 'posts/index.html'
     context = {
-        'page_obj': page_obj
+        'page_obj': page_obj,
+        **feed,
     }
     return render(request, template, context)
 
 
+@cache_policy(max_age=60, scopes=lambda slug: (group_scope(slug),))
+@conditional(group_state)
 def group_posts(request, slug):
     template = 'posts/group_list.html'
+    feed = feed_context(request, 'group', group_scope(slug))
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = Paginator(posts, settings.AMOUNT_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = feed_posts(group.posts.all())
+    page_obj = paginate(request, posts)
     context = {
         'group': group,
         'posts': posts,
-        'page_obj': page_obj
+        'page_obj': page_obj,
+        **feed,
     }
     return render(request, template, context)
 
 
+@cache_policy(max_age=60, scopes=lambda username: (author_scope(username),))
+@conditional(profile_state)
 def profile(request, username):
-    user = get_object_or_404(User, username=username)
-    posts = user.posts.all()
+    feed = feed_context(request, 'profile', author_scope(username))
+    user = get_object_or_404(
+        User.objects.select_related('counters'),
+        username=username
+    )
+    posts = feed_posts(user.posts.all())
     template = 'posts/profile.html'
-    paginator = Paginator(posts, settings.AMOUNT_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    posts_amount = posts.count()
-    following = False
-    if request.user.is_authenticated:
-        following = Follow.objects.filter(
-            user=request.user,
-            author=user
-        )
+    page_obj = paginate(request, posts)
+    counters = user_counters(user)
     context = {
         'page_obj': page_obj,
         'username': user,
-        'post_amount': posts_amount,
-        'following': following,
+        'post_amount': counters.posts_count,
+        'counters': counters,
+        'following': is_following(request.user, user),
+        **feed,
     }
     return render(request, template, context)
 
 
+@cache_policy(max_age=60, scopes=lambda post_id: (post_scope(post_id),))
+@conditional(post_state)
 def post_detail(request, post_id):
     post = get_object_or_404(
         Post.objects.select_related('author', 'group'),
@@ -64,7 +81,7 @@ def post_detail(request, post_id):
     )
     template = 'posts/post_detail.html'
     form = CommentForm(request.POST or None)
-    comments = post.comments.all()
+    comments = comment_page(post)
     context = {
         'form': form,
         'comments': comments,
@@ -75,6 +92,45 @@ def post_detail(request, post_id):
     return render(request, template, context)
 
 
+@cache_policy(max_age=60, scopes=lambda: (FEED,))
+def search_posts(request):
+    query = request.GET.get('q', '').strip()
+    posts = feed_posts()
+    try:
+        page_obj = search(
+            posts, query, settings.AMOUNT_POSTS, request.GET.get('after')
+        )
+    except InvalidCursor:
+        page_obj = search(posts, query, settings.AMOUNT_POSTS)
+    context = {
+        'page_obj': page_obj,
+        'query': query,
+    }
+    return render(request, 'posts/search.html', context)
+
+
+def comment_page(post, after=None):
+    paginator = CursorPaginator(
+        post.comments.select_related('author'),
+        settings.COMMENTS_PER_PAGE,
+        date_field='created',
+    )
+    try:
+        return paginator.page(after=after)
+    except InvalidCursor:
+        return paginator.page()
+
+
+@cache_policy(max_age=60, scopes=lambda post_id: (post_scope(post_id),))
+def post_comments(request, post_id):
+    post = get_object_or_404(Post, id=post_id)
+    context = {
+        'post': post,
+        'comments': comment_page(post, request.GET.get('after')),
+    }
+    return render(request, 'posts/includes/comment_list.html', context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
@@ -82,6 +138,7 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        schedule_thumbnails(post)
         return redirect('posts:profile', request.user.username)
     return render(request, 'posts/post_create.html', {'form': form})
 
@@ -90,7 +147,9 @@ def post_create(request):
 def post_edit(request, post_id):
     template = 'posts/post_create.html'
     is_edit = True
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), id=post_id
+    )
     if post.author == request.user:
         form = PostForm(
             request.POST or None,
@@ -99,6 +158,8 @@ def post_edit(request, post_id):
         )
         if request.method == 'POST' and form.is_valid():
             post = form.save()
+            if 'image' in form.changed_data:
+                schedule_thumbnails(post)
             return redirect('posts:post_detail', post_id)
         return render(
             request, template, {
@@ -114,7 +175,9 @@ def post_edit(request, post_id):
 @login_required
 def add_comment(request, post_id):
     form = CommentForm(request.POST or None, files=request.FILES or None)
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), id=post_id
+    )
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
@@ -125,12 +188,14 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(posts, settings.AMOUNT_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    feed = feed_context(
+        request, 'follow', FEED, follow_scope(request.user.pk)
+    )
+    posts = feed_posts(timeline_posts(request.user))
+    page_obj = paginate(request, posts, date_field='timeline_date')
     context = {
         'page_obj': page_obj,
+        **feed,
     }
     return render(request, 'posts/follow.html', context)
 
@@ -146,7 +211,5 @@ def profile_follow(request, username):
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    following = Follow.objects.filter(user=request.user, author=author)
-    if following.exists():
-        following.delete()
+    Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('posts:profile', username=username)
@@ -0,0 +1,23 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ("to", "subject", "status", "attempts", "created", "sent")
+    list_filter = ("status",)
+    search_fields = ("to",)
+    readonly_fields = ("payload", "created", "sent", "last_error")
+    actions = ("retry",)
+
+    def retry(self, request, queryset):
+        queryset.update(
+            status=OutgoingEmail.PENDING,
+            attempts=0,
+            next_attempt=timezone.now(),
+        )
+    retry.short_description = "Отправить ещё раз"
+
+
+admin.site.register(OutgoingEmail, OutgoingEmailAdmin)
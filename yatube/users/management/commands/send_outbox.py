@@ -0,0 +1,48 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from users.outbox import deliver
+
+
+class Command(BaseCommand):
+    help = (
+        "Отправляет письма из очереди пачками через одно соединение "
+        "OUTBOX_EMAIL_BACKEND; неудачные повторяются с нарастающей паузой."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.OUTBOX_BATCH_SIZE
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Работать постоянно, опрашивая очередь.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5,
+            help="Пауза в секундах, когда очередь пуста.",
+        )
+
+    def handle(self, *args, batch_size, loop, interval, **options):
+        total_sent = total_failed = 0
+        try:
+            while True:
+                sent, failed = deliver(batch_size)
+                total_sent += sent
+                total_failed += failed
+                if sent or failed:
+                    self.stdout.write(f"Отправлено: {sent}, ошибок: {failed}")
+                if sent + failed < batch_size:
+                    if not loop:
+                        break
+                    time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(
+            f"Всего отправлено: {total_sent}, ошибок: {total_failed}"
+        )
@@ -0,0 +1,74 @@
+import json
+
+from django.core.mail import EmailMultiAlternatives
+from django.db import models
+from django.utils import timezone
+
+
+class OutgoingEmail(models.Model):
+    """Письмо в очереди: сайт только пишет строку, отправляет send_outbox."""
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUSES = (
+        (PENDING, "В очереди"),
+        (SENT, "Отправлено"),
+        (FAILED, "Не отправлено"),
+    )
+
+    subject = models.TextField("Тема")
+    to = models.TextField("Кому")
+    payload = models.TextField()
+    status = models.CharField(
+        "Статус", max_length=10, choices=STATUSES, default=PENDING
+    )
+    attempts = models.PositiveSmallIntegerField("Попыток", default=0)
+    next_attempt = models.DateTimeField(
+        "Следующая попытка", default=timezone.now
+    )
+    last_error = models.TextField("Ошибка", blank=True)
+    created = models.DateTimeField("Создано", auto_now_add=True)
+    sent = models.DateTimeField("Отправлено", null=True, blank=True)
+
+    class Meta:
+        ordering = ("-created",)
+        verbose_name = "Исходящее письмо"
+        verbose_name_plural = "Исходящие письма"
+        indexes = (
+            models.Index(
+                fields=("status", "next_attempt"),
+                name="outbox_due_idx",
+            ),
+        )
+
+    def __str__(self):
+        return f"{self.to}: {self.subject}"
+
+    @classmethod
+    def from_message(cls, message):
+        if message.attachments:
+            raise ValueError("Письма с вложениями в очередь не ставятся.")
+        payload = {
+            "body": message.body,
+            "from_email": message.from_email,
+            "to": message.to,
+            "cc": message.cc,
+            "bcc": message.bcc,
+            "reply_to": message.reply_to,
+            "headers": message.extra_headers,
+            "alternatives": getattr(message, "alternatives", []),
+        }
+        return cls(
+            subject=message.subject,
+            to=", ".join(message.recipients()),
+            payload=json.dumps(payload, ensure_ascii=False),
+        )
+
+    def message(self, connection=None):
+        payload = json.loads(self.payload)
+        return EmailMultiAlternatives(
+            subject=self.subject,
+            connection=connection,
+            alternatives=[tuple(item) for item in payload.pop("alternatives")],
+            **payload,
+        )
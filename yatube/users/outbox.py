@@ -0,0 +1,101 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import connection as db_connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+
+class EmailBackend(BaseEmailBackend):
+    """EMAIL_BACKEND, который только ставит письма в очередь.
+
+    Настоящую отправку делает send_outbox через OUTBOX_EMAIL_BACKEND.
+    """
+
+    def send_messages(self, email_messages):
+        emails = [
+            OutgoingEmail.from_message(message) for message in email_messages
+        ]
+        OutgoingEmail.objects.bulk_create(emails)
+        return len(emails)
+
+
+def retry_delay(attempts):
+    """Экспоненциальная пауза перед следующей попыткой."""
+    delay = settings.OUTBOX_RETRY_DELAY * 2 ** (attempts - 1)
+    return timedelta(seconds=min(delay, settings.OUTBOX_RETRY_MAX_DELAY))
+
+
+def claim(batch_size):
+    """Забирает пачку готовых к отправке писем.
+
+    Пока пачка отправляется, её next_attempt сдвинут на OUTBOX_LEASE:
+    второй воркер эти письма не возьмёт, а упавший вернёт их в очередь.
+    """
+    now = timezone.now()
+    due = OutgoingEmail.objects.filter(
+        status=OutgoingEmail.PENDING, next_attempt__lte=now
+    ).order_by("next_attempt", "pk")
+    if db_connection.features.has_select_for_update_skip_locked:
+        due = due.select_for_update(skip_locked=True)
+    with transaction.atomic():
+        emails = list(due[:batch_size])
+        OutgoingEmail.objects.filter(
+            pk__in=[email.pk for email in emails]
+        ).update(next_attempt=now + timedelta(seconds=settings.OUTBOX_LEASE))
+    return emails
+
+
+def fail(email, error):
+    email.attempts += 1
+    email.last_error = error
+    if email.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+        email.status = OutgoingEmail.FAILED
+    else:
+        email.next_attempt = timezone.now() + retry_delay(email.attempts)
+    email.save(
+        update_fields=("attempts", "last_error", "status", "next_attempt")
+    )
+
+
+def deliver(batch_size=None):
+    """Отправляет одну пачку через одно соединение; возвращает (ушло, нет)."""
+    emails = claim(batch_size or settings.OUTBOX_BATCH_SIZE)
+    if not emails:
+        return 0, 0
+    connection = get_connection(settings.OUTBOX_EMAIL_BACKEND)
+    try:
+        connection.open()
+    except Exception as exc:
+        for email in emails:
+            fail(email, f"Соединение: {exc}")
+        return 0, len(emails)
+    sent = []
+    failed = 0
+    try:
+        for email in emails:
+            try:
+                delivered = connection.send_messages([email.message()])
+            except Exception as exc:
+                delivered = 0
+                error = repr(exc)
+            else:
+                error = "Бэкенд не принял письмо."
+            if delivered:
+                sent.append(email.pk)
+            else:
+                fail(email, error)
+                failed += 1
+    finally:
+        connection.close()
+    OutgoingEmail.objects.filter(pk__in=sent).update(
+        status=OutgoingEmail.SENT,
+        sent=timezone.now(),
+        attempts=F("attempts") + 1,
+        last_error="",
+    )
+    return len(sent), failed
@@ -0,0 +1,89 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import OutgoingEmail
+from ..outbox import deliver
+
+User = get_user_model()
+
+
+@override_settings(
+    EMAIL_BACKEND="users.outbox.EmailBackend",
+    OUTBOX_EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+    OUTBOX_MAX_ATTEMPTS=2,
+)
+class OutboxTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username="user", email="user@example.com", password="pass"
+        )
+
+    def test_password_reset_only_enqueues(self):
+        response = self.client.post(
+            reverse("users:reset_password"), {"email": "user@example.com"}
+        )
+        self.assertRedirects(response, reverse("users:password_reset_done"))
+        self.assertEqual(len(mail.outbox), 0)
+        email = OutgoingEmail.objects.get()
+        self.assertEqual(email.to, "user@example.com")
+
+        out = StringIO()
+        call_command("send_outbox", stdout=out)
+        self.assertIn("Всего отправлено: 1", out.getvalue())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["user@example.com"])
+        self.assertIn("/reset/", mail.outbox[0].body)
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutgoingEmail.SENT)
+        self.assertEqual(deliver(), (0, 0))
+
+    def test_batch_uses_one_connection(self):
+        mail.send_mass_mail(
+            [("Тема", "Текст", None, [f"{i}@example.com"]) for i in range(5)]
+        )
+        with mock.patch(
+            "django.core.mail.backends.locmem.EmailBackend.open"
+        ) as opened:
+            self.assertEqual(deliver(batch_size=3), (3, 0))
+        opened.assert_called_once()
+        self.assertEqual(deliver(batch_size=3), (2, 0))
+
+    def test_failures_back_off_then_give_up(self):
+        mail.EmailMultiAlternatives(
+            "Тема", "Текст", to=["user@example.com"],
+            alternatives=[("<p>Текст</p>", "text/html")],
+        ).send()
+        broken = mock.patch(
+            "django.core.mail.backends.locmem.EmailBackend.send_messages",
+            side_effect=OSError("нет связи"),
+        )
+        with broken:
+            self.assertEqual(deliver(), (0, 1))
+        email = OutgoingEmail.objects.get()
+        self.assertEqual(email.status, OutgoingEmail.PENDING)
+        self.assertGreater(email.next_attempt, timezone.now())
+        self.assertIn("нет связи", email.last_error)
+        self.assertEqual(deliver(), (0, 0))
+
+        email.next_attempt = timezone.now() - timedelta(seconds=1)
+        email.save()
+        with broken:
+            deliver()
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutgoingEmail.FAILED)
+
+        email.status = OutgoingEmail.PENDING
+        email.next_attempt = timezone.now()
+        email.save()
+        deliver()
+        self.assertEqual(mail.outbox[0].alternatives[0][1], "text/html")
@@ -50,11 +50,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.query_budget.QueryBudgetMiddleware",
+    "core.db.replicas.PrimaryPinMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "django.middleware.http.ConditionalGetMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "core.page_cache.AnonymousPageCacheMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -87,13 +91,40 @@ WSGI_APPLICATION = "yatube.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# SQLite с WAL и прагмами из core.db.sqlite3. Соединение живёт между
+# запросами и проверяется перед использованием; atomic() сразу берёт
+# блокировку записи, а занятая база переспрашивается с паузой.
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
+        "ENGINE": "core.db.sqlite3",
         "NAME": os.path.join(BASE_DIR, "db.sqlite3"),
+        "CONN_MAX_AGE": 600,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            "transaction_mode": "IMMEDIATE",
+            "busy_retries": 3,
+            "pragmas": {
+                "busy_timeout": 5000,
+                "cache_size": -20000,
+                "mmap_size": 256 * 1024 * 1024,
+            },
+        },
     }
 }
 
+# Чтение идёт с реплик, запись и чтение после записи — с default.
+# Для локальной проверки реплика — копия файла (manage.py copy_replicas):
+# DATABASES["replica"] = {
+#     **DATABASES["default"],
+#     "NAME": os.path.join(BASE_DIR, "db-replica.sqlite3"),
+#     "TEST": {"MIRROR": "default"},
+# }
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != "default"]
+DATABASE_ROUTERS = ["core.db.replicas.PrimaryReplicaRouter"]
+# Столько секунд после записи пользователь читает основную базу.
+PRIMARY_PIN_COOKIE = "primary_pin"
+PRIMARY_PIN_SECONDS = 10
+
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
@@ -122,10 +153,49 @@ AUTH_PASSWORD_VALIDATORS = [
 LOGIN_URL = "users:login"
 LOGIN_REDIRECT_URL = "posts:index"
 
-EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
+# Письма сайта только ставятся в очередь; отправляет их send_outbox
+# через OUTBOX_EMAIL_BACKEND, одним соединением на пачку.
+EMAIL_BACKEND = "users.outbox.EmailBackend"
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
+OUTBOX_EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_ATTEMPTS = 6
+# Паузы между попытками: 1, 2, 4... минуты, но не больше часа.
+OUTBOX_RETRY_DELAY = 60
+OUTBOX_RETRY_MAX_DELAY = 60 * 60
+# На это время взятая воркером пачка скрыта от других воркеров.
+OUTBOX_LEASE = 5 * 60
 
 AMOUNT_POSTS = 10
+COMMENTS_PER_PAGE = 20
+
+# Выгрузка постов в NDJSON: строк на страницу по умолчанию и максимум.
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 10000
+
+# До этого числа строк админка считает их точно, дальше — оценивает.
+ESTIMATED_COUNT_LIMIT = 10000
+
+# Курсорная пагинация лент (?after=/?before=) вместо номеров страниц.
+CURSOR_PAGINATION = False
+
+# Лента подписок: авторы с таким числом подписчиков не раскладываются
+# по лентам при публикации, их посты читаются напрямую.
+TIMELINE_FANOUT_LIMIT = 1000
+TIMELINE_BACKFILL = 200
+TIMELINE_BATCH_SIZE = 500
+
+FOLLOWEES_CACHE_TIMEOUT = 60 * 60
+
+# Фрагменты лент сбрасываются сигналами, поэтому могут жить долго.
+FEED_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Карточки постов: ключ меняется вместе с данными, сброс не нужен.
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Готовые страницы для анонимов; сбрасываются теми же версиями данных.
+PAGE_CACHE_ENABLED = not DEBUG
+PAGE_CACHE_TIMEOUT = 60 * 60
 
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
@@ -151,3 +221,47 @@ STATIC_URL = "/static/"
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
+
+# Загрузки лежат по хэшу содержимого, одинаковые хранятся один раз.
+# Старые файлы переносит manage.py migrate_media.
+DEFAULT_FILE_STORAGE = "core.storage.HashedStorage"
+# Миниатюры sorl уже раскладываются по хэшу и сохраняются под своим
+# именем, поэтому им нужно обычное хранилище.
+THUMBNAIL_STORAGE = "django.core.files.storage.FileSystemStorage"
+
+# Миниатюры загруженных картинок создаются в фоне, а не при первом показе.
+THUMBNAIL_PREGENERATE = True
+THUMBNAIL_WORKERS = 2
+
+# Записи sorl-thumbnail хранятся в кэше, перед ним — LRU в памяти процесса.
+THUMBNAIL_KVSTORE = 'core.kvstore.KVStore'
+THUMBNAIL_KVSTORE_L1_SIZE = 1000
+THUMBNAIL_KVSTORE_L1_TIMEOUT = 300
+
+# Ширины вариантов картинки поста для srcset и атрибут sizes.
+POST_IMAGE_WIDTHS = (480, 960, 1440)
+POST_IMAGE_DEFAULT_WIDTH = 960
+POST_IMAGE_SIZES = '(max-width: 992px) 100vw, 960px'
+
+# Загруженные картинки уменьшаются до этого размера и пересохраняются.
+POST_IMAGE_MAX_SIZE = (2048, 2048)
+POST_IMAGE_QUALITY = 85
+
+# Учёт SQL на каждый запрос: строка в лог core.query_budget, WARNING при
+# превышении бюджета; в режиме отладки ещё и заголовки X-DB-*.
+QUERY_BUDGET = 30
+QUERY_STATS_HEADERS = DEBUG
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.query_budget': {
+            'handlers': ['console'],
+            'level': 'WARNING' if DEBUG else 'INFO',
+        },
+    },
+}